@@ -2,35 +2,435 @@
 
 Flask App to convert CLI program into Reactive Web Server.
 
+/run analyzes the payload inside the request. The AST is only included
+on request (?ast=compact or ?ast=pretty, optionally narrowed down with
+?ast_functions=f,g and ?ast_lines=10-20,30). With ?stream=ndjson (or
+?stream=sse) it streams a record per function as soon as that function is
+done, followed by a summary record.
+/jobs hands the payload to a bounded process pool instead: POST /jobs
+answers right away with a job id, and GET /jobs/<id> reports the status
+and, once done, the results.
+
+Finished (non streamed) responses are kept in a ResultCache keyed by the
+payload and the request options, answered with an X-Cache: HIT header. With
+SYMBEX_CACHE_DIR set, function results are also shared on disk through an
+AnalysisCache, by every worker process and across restarts.
+
+/metrics reports the work done so far (solver calls and time, paths,
+forks, AST conversion time) per module and function in the Prometheus text
+format. The module label is taken from ?module=name on /run and /jobs.
+
 author: Richard White
 
 '''
+import ast
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from flask_cors import CORS
-from flask import Flask, request
-from symbex import ModuleParser
+from flask import Flask, Response, request, stream_with_context
+from symbex import ModuleParser, FunctionParser
+from search import STRATEGIES
+from cache import AnalysisCache, ResultCache
+from metrics import Registry
 
 
 app = Flask(__name__)
 CORS(app)
 
+# worker processes analyzing jobs
+JOB_WORKERS = 2
+# jobs queued or running at once, further submissions get a 429
+MAX_PENDING_JOBS = 16
+# seconds a finished job is kept for GET /jobs/<id>
+JOB_TTL = 600
+
+# in-process response cache limits
+RESULT_CACHE_ENTRIES = 256
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 3600
+# optional shared on-disk tier of function results
+RESULT_CACHE_DIR = os.environ.get('SYMBEX_CACHE_DIR')
+
+# distinct (module, function) series reported by /metrics
+METRICS_MAX_SERIES = 1000
+# module label of submissions without ?module=
+DEFAULT_MODULE = 'default'
+
+# /run?stream=... formats
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+# /run?ast=... formats, name -> json indent
+AST_FORMATS = {
+    'compact': None,
+    'pretty': 4,
+}
+
+# FunctionParser options accepted as query parameters, name -> type
+OPTION_TYPES = {
+    'merge': bool,
+    'strategy': str,
+    'seed': int,
+    'max_paths': int,
+    'max_depth': int,
+    'time_budget': float,
+    'query_timeout': float,
+    'rlimit': int,
+    'unroll': int,
+}
+
+jobs: dict = {}  # job id -> job record
+jobs_lock = threading.Lock()
+pool = None
+
+result_cache = ResultCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES,
+                           RESULT_CACHE_TTL)
+disk_cache = AnalysisCache(RESULT_CACHE_DIR) if RESULT_CACHE_DIR else None
+registry = Registry(METRICS_MAX_SERIES)
+
+
+'''
+GET_OPTIONS
+FunctionParser options from the query string, raises ValueError on a bad
+value
+'''
+
+
+def get_options(args) -> dict:
+    options = {}
+    for name, option_type in OPTION_TYPES.items():
+        value = args.get(name)
+        if value is None:
+            continue
+
+        if option_type is bool:
+            options[name] = value.lower() in ('1', 'true', 'yes', 'on')
+        else:
+            options[name] = option_type(value)
+
+    if options.get('strategy', 'dfs') not in STRATEGIES:
+        raise ValueError(f"unknown search strategy: {options['strategy']}")
+    return options
+
+
+'''
+GET_AST_ARGS
+ModuleParser.get_ast keyword arguments from the query string, None when
+the AST was not asked for. Raises ValueError on a bad value.
+'''
+
+
+def get_ast_args(args):
+    ast_format = args.get('ast')
+    if ast_format is None or ast_format == 'none':
+        return None
+    if ast_format not in AST_FORMATS:
+        raise ValueError(f"unknown ast format: {ast_format}")
+
+    ast_args = {'indent': AST_FORMATS[ast_format]}
+
+    functions = args.get('ast_functions')
+    if functions:
+        ast_args['functions'] = functions.split(',')
+
+    lines = args.get('ast_lines')
+    if lines:
+        ast_args['lines'] = []
+        for line_range in lines.split(','):
+            first, _, last = line_range.partition('-')
+            ast_args['lines'].append((int(first), int(last or first)))
+
+    return ast_args
+
+
+'''
+ANALYZE_MODULE
+job worker entry point, returns the same document as /run, along with the
+FunctionResults and AST timings for the metrics registry
+ast_args: get_ast keyword arguments, None to leave the AST out
+'''
+
+
+def analyze_module(payload: str, options: dict = None,
+                   ast_args: dict = None, cache=None):
+    try:
+        ast.parse(payload)
+    except SyntaxError as ex:
+        return {'error': str(ex)}, [], None
+
+    parser: ModuleParser = ModuleParser(payload, cache=cache,
+                                        options=options)
+    parser.parse()
+
+    resp: dict = {'results': parser.results()}
+    if ast_args is not None:
+        resp['ast'] = parser.get_ast(**ast_args)
+    return resp, get_results(parser), parser.timings
+
+
+'''
+GET_RESULTS - FunctionResults of a parsed ModuleParser
+'''
+
+
+def get_results(parser: ModuleParser) -> list:
+    return [func.result() if isinstance(func, FunctionParser) else func
+            for func in parser.functions]
+
+
+'''
+OBSERVE - add the work done on a module to the metrics registry
+'''
+
+
+def observe(module: str, results: list, timings: dict = None):
+    for result in results:
+        registry.observe(module, result)
+    if timings is not None:
+        registry.observe_module(timings)
+
+
+'''
+GET_POOL - the job pool, started with the first job
+'''
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+    return pool
+
+
+'''
+EXPIRE_JOBS - forget finished jobs older than JOB_TTL, call with the lock
+'''
+
+
+def expire_jobs():
+    now = time.time()
+    for job_id in [job_id for job_id, job in jobs.items()
+                   if job['finished'] is not None
+                   and now - job['finished'] > JOB_TTL]:
+        del jobs[job_id]
+
+
+'''
+CACHE_HEADERS
+'''
+
+
+def cache_headers(hit: bool, age: float = 0) -> dict:
+    if hit:
+        return {'X-Cache': 'HIT', 'Age': str(int(age))}
+    return {'X-Cache': 'MISS'}
+
+
+'''
+FINISH_JOB - future callback, stores the outcome on the job record
+'''
+
+
+def finish_job(job: dict, cache_key: str, module: str, future):
+    with jobs_lock:
+        try:
+            result, results, timings = future.result()
+            observe(module, results, timings)
+            if 'error' in result:
+                job['status'] = 'failed'
+                job['error'] = result['error']
+            else:
+                job['status'] = 'done'
+                job['result'] = result
+        except Exception as ex:
+            job['status'] = 'failed'
+            job['error'] = repr(ex)
+        job['finished'] = time.time()
+
+    if job['status'] == 'done':
+        result_cache.put(cache_key, job['result'])
+
+
+'''
+STREAM_RECORDS
+one record per function as it finishes, then a summary. An exception
+ends the stream with an error record, the response is already underway.
+'''
+
+
+def stream_records(parser: ModuleParser, module: str):
+    start = time.perf_counter()
+    summary = {'type': 'summary', 'functions': 0, 'tests': 0, 'errors': 0,
+               'undecided': 0, 'complete': True}
+
+    try:
+        for result in parser.iter_parse():
+            registry.observe(module, result)
+            record = result.to_dict()
+            summary['functions'] += 1
+            summary['tests'] += len(record['tests'])
+            summary['errors'] += len(record['errors'])
+            summary['undecided'] += len(record['undecided'])
+            summary['complete'] = summary['complete'] and record['complete']
+            yield {'type': 'function', **record}
+    except Exception as ex:
+        yield {'type': 'error', 'error': repr(ex)}
+
+    registry.observe_module(parser.timings)
+    summary['time'] = time.perf_counter() - start
+    yield summary
+
+
+'''
+FORMAT_RECORD - a record as an NDJSON line or a server-sent event
+'''
+
+
+def format_record(record: dict, stream: str) -> str:
+    if stream == 'sse':
+        return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+    return json.dumps(record) + '\n'
+
 
 @app.route('/run', methods=['POST'])
 def run():
     print("RUN CALLED...")
 
     payload: str = request.data
+    module = request.args.get('module', DEFAULT_MODULE)
+
+    stream = request.args.get('stream')
+    if stream is not None:
+        if stream not in STREAM_MIMETYPES:
+            return {'error': f"unknown stream format: {stream}"}, 400
+        try:
+            options = get_options(request.args)
+            ast.parse(payload)
+        except (ValueError, SyntaxError) as ex:
+            return {'error': str(ex)}, 400
+
+        parser: ModuleParser = ModuleParser(payload, cache=disk_cache,
+                                            options=options)
+        records = (format_record(record, stream)
+                   for record in stream_records(parser, module))
+        return Response(stream_with_context(records),
+                        mimetype=STREAM_MIMETYPES[stream],
+                        headers={'Cache-Control': 'no-cache',
+                                 'X-Accel-Buffering': 'no'})
+
+    try:
+        options = get_options(request.args)
+        ast_args = get_ast_args(request.args)
+        ast.parse(payload)
+    except (ValueError, SyntaxError) as ex:
+        return {'error': str(ex)}, 400
+
+    cache_key = ResultCache.key(payload, options, ast_args)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        resp, age = cached
+        return resp, 200, cache_headers(True, age)
 
     print(payload)
-    parser: ModuleParser = ModuleParser(payload)
+    parser: ModuleParser = ModuleParser(payload, cache=disk_cache,
+                                        options=options)
 
     parser.parse()
-    parser.results()
 
     resp: dict = {
-        'ast': parser.get_ast(),
         'results': parser.results()
     }
-    return resp
+    if ast_args is not None:
+        resp['ast'] = parser.get_ast(**ast_args)
+    observe(module, get_results(parser), parser.timings)
+
+    result_cache.put(cache_key, resp)
+    return resp, 200, cache_headers(False)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    global pool
+
+    try:
+        options = get_options(request.args)
+        ast_args = get_ast_args(request.args)
+    except ValueError as ex:
+        return {'error': str(ex)}, 400
+
+    payload: str = request.get_data(as_text=True)
+    module = request.args.get('module', DEFAULT_MODULE)
+
+    # a cached response makes a job that is done on arrival
+    cache_key = ResultCache.key(payload, options, ast_args)
+    cached = result_cache.get(cache_key)
+
+    with jobs_lock:
+        expire_jobs()
+
+        if cached is not None:
+            job_id = uuid.uuid4().hex
+            jobs[job_id] = {'id': job_id, 'status': 'done',
+                            'submitted': time.time(),
+                            'finished': time.time(), 'result': cached[0]}
+            return {'id': job_id, 'status': 'done'}, 202, \
+                {'Location': f"/jobs/{job_id}", **cache_headers(True, cached[1])}
+
+        pending = sum(1 for job in jobs.values() if job['finished'] is None)
+        if pending >= MAX_PENDING_JOBS:
+            return {'error': 'too many pending jobs'}, 429, \
+                {'Retry-After': '5'}
+
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'status': 'queued', 'submitted': time.time(),
+               'finished': None}
+        try:
+            future = get_pool().submit(analyze_module, payload, options,
+                                       ast_args, disk_cache)
+        except (BrokenProcessPool, RuntimeError) as ex:
+            # a crashed pool is replaced for the next submission
+            pool = None
+            return {'error': f"job pool unavailable: {ex}"}, 503
+
+        job['future'] = future
+        jobs[job_id] = job
+
+    future.add_done_callback(partial(finish_job, job, cache_key, module))
+    return {'id': job_id, 'status': 'queued'}, 202, \
+        {'Location': f"/jobs/{job_id}", **cache_headers(False)}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return {'error': f"unknown job: {job_id}"}, 404
+
+        status = job['status']
+        if status == 'queued' and job['future'].running():
+            status = 'running'
+
+        resp: dict = {'id': job_id, 'status': status}
+        if 'result' in job:
+            resp.update(job['result'])
+        if 'error' in job:
+            resp['error'] = job['error']
+        return resp
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.prometheus(),
+                    mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
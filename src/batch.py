@@ -0,0 +1,175 @@
+'''
+
+Batch mode: analyze whole directories/globs of python source files and
+stream one JSON-lines record per function.
+
+Files are parsed in the parent and their functions are handed out one by
+one to a bounded process pool. Workers live for the whole run so Z3 is
+imported once per worker rather than once per file, and at most a few
+functions per worker are in flight at any time, so records are written out
+as each function completes. One slow function does not hold back the
+records of the rest of its file, and the functions of a large file are
+spread over all workers.
+
+The engine prints its diagnostics to stdout, while parsing and analyzing
+they are sent to stderr so stdout only carries the JSON lines.
+
+'''
+import ast
+import contextlib
+import glob
+import json
+import os
+import sys
+import concurrent.futures
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Iterator, List
+from symbex import get_functions, analyze_function
+
+
+'''
+FIND_PYTHON_FILES
+expand directories (recursively) and glob patterns into python files
+'''
+
+
+def find_python_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.py'):
+                        yield os.path.join(root, name)
+
+        elif glob.has_magic(path):
+            for match in sorted(glob.glob(path, recursive=True)):
+                if os.path.isfile(match) and match.endswith('.py'):
+                    yield match
+
+        else:
+            yield path
+
+
+'''
+PARSE_FILE
+top-level functions of the file, or the error record when it cannot be
+read or parsed
+'''
+
+
+def parse_file(filename: str):
+    try:
+        with open(filename) as source:
+            ast_tree = ast.parse(source.read(), filename)
+    except Exception as ex:
+        return None, {'file': filename, 'error': str(ex)}
+
+    with contextlib.redirect_stdout(sys.stderr):
+        return get_functions(ast_tree), None
+
+
+'''
+ANALYZE_BODY
+worker entry point: the record of a single function. Errors are recorded
+instead of raised so one bad function cannot stop the batch.
+cache: optional AnalysisCache shared (on disk) by all workers
+options: FunctionParser keyword arguments
+'''
+
+
+def analyze_body(filename: str, body: ast.FunctionDef, cache=None,
+                 options: dict = None) -> dict:
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = cache.get(body, options) if cache is not None else None
+            if result is None:
+                result = analyze_function(body, options)
+                if cache is not None:
+                    cache.put(body, result, options)
+        record = result.to_dict()
+    except Exception as ex:
+        record = {'function': body.name, 'error': repr(ex)}
+
+    return {'file': filename, **record}
+
+
+'''
+ANALYZE_FILE
+one record per top-level function of the file
+'''
+
+
+def analyze_file(filename: str, cache=None, options: dict = None) -> list:
+    functions, error = parse_file(filename)
+    if error is not None:
+        return [error]
+
+    return [analyze_body(filename, body, cache, options)
+            for body in functions]
+
+
+'''
+ITER_RECORDS
+yields records as functions finish. jobs: worker processes (0 = all
+cores), jobs=1 analyzes in-process. With a pool the records of a file are
+not kept together, records come in completion order.
+'''
+
+
+def iter_records(paths: List[str], jobs: int = 1, cache=None,
+                 options: dict = None) -> Iterator[dict]:
+    filenames = find_python_files(paths)
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1:
+        for filename in filenames:
+            yield from analyze_file(filename, cache, options)
+        return
+
+    # bound the number of queued functions so results stream out steadily
+    max_pending = jobs * 2
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        for filename in filenames:
+            functions, error = parse_file(filename)
+            if error is not None:
+                yield error
+                continue
+
+            for body in functions:
+                pending.add(pool.submit(analyze_body, filename, body, cache,
+                                        options))
+
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+'''
+RUN_BATCH
+write every record as a JSON line to out (default stdout)
+'''
+
+
+def run_batch(paths: List[str], out=None, jobs: int = 1, cache=None,
+              options: dict = None) -> int:
+    out = out or sys.stdout
+    count = 0
+
+    for record in iter_records(paths, jobs, cache, options):
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+        count += 1
+
+    return count
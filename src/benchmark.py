@@ -0,0 +1,324 @@
+'''
+
+Benchmark suite for the symbolic engine.
+
+Generates synthetic modules with a controlled shape (sequential ifs,
+nesting depth, bool/int/str mix, loops, module size), runs them through
+FileParser end to end and reports wall time, solver calls, paths and peak
+memory as JSON, so two versions of the engine can be compared.
+
+It also measures the CLI's import time in a fresh interpreter and checks
+it against a budget: the time itself, and that none of the modules which
+are meant to load on first use (z3, ast2json, multiprocessing) were
+imported. --imports-only runs just that check and exits 1 when it fails.
+
+usage: python src/benchmark.py [-w nested loops] [--repeat 5] [-o out.json]
+       python src/benchmark.py --imports-only [--import-budget 0.1]
+
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from symbex import ENGINE_VERSION, FileParser, FunctionParser
+
+
+# named workloads, generate_module keyword arguments
+WORKLOADS = {
+    'sequential': {'functions': 10, 'ifs': 8, 'depth': 1},
+    'nested': {'functions': 10, 'ifs': 2, 'depth': 4},
+    'mixed': {'functions': 10, 'ifs': 6, 'depth': 2,
+              'types': ['int', 'bool', 'str']},
+    'loops': {'functions': 10, 'ifs': 3, 'depth': 1, 'loops': 3},
+    'large_module': {'functions': 100, 'ifs': 4, 'depth': 2},
+}
+
+STRINGS = ['GET', 'POST', 'PUT', 'DELETE', 'HEAD']
+
+# seconds the CLI module may take to import
+IMPORT_BUDGET = 0.1
+# modules the CLI must not import at startup
+DEFERRED_MODULES = ['z3', 'ast2json', 'multiprocessing']
+
+
+'''
+GENERATE_CONDITION - a branch test on one of the arguments
+'''
+
+
+def generate_condition(rng: random.Random, args: list) -> str:
+    name, var_type = rng.choice(args)
+
+    if var_type == 'bool':
+        return rng.choice([name, f"not {name}"])
+    if var_type == 'str':
+        return f"{name} == '{rng.choice(STRINGS)}'"
+
+    op = rng.choice(['>', '<', '==', '%'])
+    value = rng.randint(1, 100)
+    if op == '%':
+        return f"{name} % {rng.randint(2, 9)} == 0"
+    return f"{name} {op} {value}"
+
+
+'''
+GENERATE_BLOCK - an if of the given nesting depth, as indented lines
+'''
+
+
+def generate_block(rng: random.Random, args: list, depth: int,
+                   indent: int) -> list:
+    pad = '    ' * indent
+    lines = [f"{pad}if {generate_condition(rng, args)}:"]
+
+    if depth > 1:
+        lines.extend(generate_block(rng, args, depth - 1, indent + 1))
+        lines.append(f"{pad}else:")
+        lines.extend(generate_block(rng, args, depth - 1, indent + 1))
+    else:
+        lines.append(f"{pad}    x = x + {rng.randint(1, 9)}")
+    return lines
+
+
+'''
+GENERATE_FUNCTION
+ifs: sequential if statements, depth: nesting depth of each of them
+types: argument types to draw from, one argument per type and per 2 ifs
+loops: counted loops (an accumulating for over range() and a concrete
+       while) placed before the ifs
+'''
+
+
+def generate_function(name: str, ifs: int = 4, depth: int = 1,
+                      types: list = None, loops: int = 0,
+                      seed: int = 0) -> str:
+    rng = random.Random(f"{name}-{seed}")
+    types = types or ['int']
+
+    args = [(f"{var_type[0]}{i}", var_type)
+            for i in range(max(1, ifs // 2)) for var_type in types]
+    int_args = [name for name, var_type in args if var_type == 'int']
+
+    lines = [f"def {name}({', '.join(f'{n}: {t}' for n, t in args)}) -> int:",
+             "    x: int = 0"]
+
+    for i in range(loops):
+        if int_args and i % 2 == 0:
+            lines.append(f"    for j{i} in range({rng.choice(int_args)}):")
+            lines.append(f"        x += {rng.randint(1, 9)}")
+        else:
+            lines.append(f"    k{i}: int = 0")
+            lines.append(f"    while k{i} < {rng.randint(2, 5)}:")
+            lines.append(f"        k{i} = k{i} + 1")
+
+    for i in range(ifs):
+        lines.extend(generate_block(rng, args, depth, 1))
+
+    lines.append("    return x")
+    return '\n'.join(lines) + '\n'
+
+
+'''
+GENERATE_MODULE - functions: number of generated functions
+'''
+
+
+def generate_module(functions: int = 10, seed: int = 0, **kwargs) -> str:
+    return '\n\n'.join(generate_function(f"func_{i}", seed=seed, **kwargs)
+                       for i in range(functions))
+
+
+'''
+RUN_FILE
+analyze a file end to end, returns (seconds, totals of the function stats)
+'''
+
+
+def run_file(filename: str, jobs: int = 1, options: dict = None):
+    start = time.perf_counter()
+    parser = FileParser(filename, jobs=jobs, options=options)
+    parser.parse()
+    results = [func.result() if isinstance(func, FunctionParser) else func
+               for func in parser.functions]
+    elapsed = time.perf_counter() - start
+
+    totals = {'solver_calls': 0, 'z3_checks': 0, 'cached_queries': 0,
+              'paths': 0, 'tests': 0, 'errors': 0}
+    for result in results:
+        totals['solver_calls'] += result.stats['solver_calls']
+        totals['z3_checks'] += result.stats['z3_checks']
+        totals['cached_queries'] += result.stats['cached_queries']
+        totals['paths'] += result.stats['paths']
+        totals['tests'] += len(result.tests)
+        totals['errors'] += len(result.errors)
+    return elapsed, totals
+
+
+'''
+RUN_WORKLOAD
+timed runs first, then one run under tracemalloc for the peak memory
+(tracemalloc slows the engine down and only sees this process, so with
+jobs > 1 the peak excludes the workers)
+'''
+
+
+def run_workload(name: str, params: dict, repeat: int = 3, jobs: int = 1,
+                 options: dict = None, seed: int = 0) -> dict:
+    source = generate_module(seed=seed, **params)
+
+    fd, filename = tempfile.mkstemp(prefix=f"symbex-{name}-", suffix='.py')
+    try:
+        with os.fdopen(fd, 'w') as module:
+            module.write(source)
+
+        times = []
+        for _ in range(repeat):
+            elapsed, totals = run_file(filename, jobs, options)
+            times.append(elapsed)
+
+        tracemalloc.start()
+        run_file(filename, jobs, options)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.remove(filename)
+
+    return {
+        'workload': name,
+        'params': params,
+        'lines': source.count('\n'),
+        'time': statistics.median(times),
+        'time_min': min(times),
+        'times': times,
+        **totals,
+        'peak_memory': peak,
+    }
+
+
+'''
+MEASURE_IMPORT
+imports module in fresh interpreters (python -X importtime), returns the
+best cumulative import time in seconds and every module imported
+'''
+
+
+def measure_import(module: str = 'main', repeat: int = 5):
+    src = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                               f"import {module}"],
+                              cwd=src, capture_output=True, text=True,
+                              check=True)
+        imported = {}
+        for line in proc.stderr.splitlines():
+            match = re.match(r'import time:\s*\d+ \|\s*(\d+) \| *(\S+)', line)
+            if match:
+                imported[match.group(2)] = int(match.group(1))
+        times.append(imported[module] / 1e6)
+    return min(times), sorted(imported)
+
+
+'''
+CHECK_IMPORTS
+JSON friendly import report, 'ok' is False when the budget is exceeded
+or a deferred module was imported
+'''
+
+
+def check_imports(budget: float = IMPORT_BUDGET, repeat: int = 5) -> dict:
+    seconds, imported = measure_import('main', repeat)
+    eager = [name for name in imported
+             if name.split('.')[0] in DEFERRED_MODULES]
+    return {
+        'module': 'main',
+        'time': seconds,
+        'budget': budget,
+        'eager': eager,
+        'ok': seconds <= budget and not eager,
+    }
+
+
+'''
+RUN_SUITE - JSON friendly report of the given workloads
+'''
+
+
+def run_suite(names: list = None, repeat: int = 3, jobs: int = 1,
+              options: dict = None, seed: int = 0,
+              import_budget: float = IMPORT_BUDGET) -> dict:
+    names = names or list(WORKLOADS)
+    return {
+        'engine_version': ENGINE_VERSION,
+        'python': platform.python_version(),
+        'jobs': jobs,
+        'options': options or {},
+        'seed': seed,
+        'imports': check_imports(import_budget),
+        'results': [run_workload(name, WORKLOADS[name], repeat, jobs,
+                                 options, seed)
+                    for name in names],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='benchmark the symbolic engine on generated workloads')
+    parser.add_argument('--workload', '-w', nargs='+',
+                        choices=list(WORKLOADS),
+                        help='workloads to run (default: all)')
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='timed runs per workload, the median is reported')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='worker processes per file (0 = all cores)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the workload generator')
+    parser.add_argument('--unroll', type=int,
+                        help='unroll while loops up to this many iterations')
+    parser.add_argument('--merge', action='store_true',
+                        help='merge assignment-only branches')
+    parser.add_argument('--output', '-o',
+                        help='write the JSON report to this file')
+    parser.add_argument('--print-source', action='store_true',
+                        help='print the generated modules instead')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                        help='seconds the CLI may take to import')
+    parser.add_argument('--imports-only', action='store_true',
+                        help='only check the import budget, exit 1 if exceeded')
+    args = parser.parse_args()
+
+    names = args.workload or list(WORKLOADS)
+
+    if args.imports_only:
+        imports = check_imports(args.import_budget)
+        print(json.dumps(imports, indent=2))
+        sys.exit(0 if imports['ok'] else 1)
+
+    if args.print_source:
+        for name in names:
+            print(f"# workload: {name}")
+            print(generate_module(seed=args.seed, **WORKLOADS[name]))
+        sys.exit(0)
+
+    options = {}
+    if args.unroll is not None:
+        options['unroll'] = args.unroll
+    if args.merge:
+        options['merge'] = True
+
+    report = run_suite(names, args.repeat, args.jobs, options, args.seed,
+                       args.import_budget)
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,317 @@
+'''
+
+Persistent on-disk analysis cache.
+
+Entries are content addressed: the key is a hash of the normalized AST of a
+FunctionDef (line/column attributes excluded), the line of every statement
+relative to the "def" line, the engine version and the analysis options.
+The value is the finished FunctionResult, with line numbers stored relative
+to the "def" line and re-based on load. Moving a function around the file
+does not invalidate it, a blank line or comment inside it does.
+
+Every entry is written to a temp file and atomically renamed into place, so
+several processes can share one cache directory. When the directory grows
+past max_bytes the least recently used entries are evicted.
+
+ResultCache is the in-process tier in front of it for the web service:
+whole response documents keyed by a hash of the posted payload and the
+request options, so a repeated submission is a dictionary lookup.
+
+MemoryCache is the same per-function cache as AnalysisCache held in
+memory, for the long lived analysis daemon, optionally in front of an
+AnalysisCache.
+
+'''
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from symbex import ENGINE_VERSION, FunctionResult
+
+
+'''
+GET_LAYOUT
+line of every statement relative to the "def" line. Cached results store
+relative lines, so two bodies only share them when these agree.
+'''
+
+
+def get_layout(body: ast.FunctionDef) -> str:
+    return ','.join(str(node.lineno - body.lineno)
+                    for node in ast.walk(body) if isinstance(node, ast.stmt))
+
+
+'''
+AnalysisCache
+'''
+
+
+class AnalysisCache():
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # approximate, refreshed from disk whenever eviction is considered
+        self.size = self.disk_usage()
+
+    '''
+    KEY
+    '''
+
+    def key(self, body: ast.FunctionDef, options: dict = None) -> str:
+        digest = hashlib.sha256()
+        digest.update(ENGINE_VERSION.encode())
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        digest.update(ast.dump(body, include_attributes=False).encode())
+        digest.update(get_layout(body).encode())
+        return digest.hexdigest()
+
+    '''
+    PATH - entries are sharded by the first two hex digits of the key
+    '''
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    '''
+    GET
+    returns a FunctionResult or None on a miss
+    '''
+
+    def get(self, body: ast.FunctionDef, options: dict = None):
+        path = self.path(self.key(body, options))
+        try:
+            with open(path) as entry:
+                record = json.load(entry)
+            # refresh the entry's age for LRU eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, evicted concurrently or partially written by an
+            # older version, in any case treat as a miss
+            return None
+
+        result = FunctionResult.from_dict(record, body.lineno)
+        result.cached = True
+        return result
+
+    '''
+    PUT
+    '''
+
+    def put(self, body: ast.FunctionDef, result: FunctionResult,
+            options: dict = None):
+        path = self.path(self.key(body, options))
+        data = json.dumps(result.to_dict(body.lineno))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    '''
+    ENTRIES - (mtime, size, path) of every entry on disk
+    '''
+
+    def entries(self) -> list:
+        entries = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    '''
+    DISK USAGE
+    '''
+
+    def disk_usage(self) -> int:
+        return sum(size for mtime, size, path in self.entries())
+
+    '''
+    EVICT
+    drop least recently used entries until the cache is back under 90%
+    of its budget, leaving headroom so every put does not trigger a scan
+    '''
+
+    def evict(self):
+        entries = sorted(self.entries())
+        self.size = sum(size for mtime, size, path in entries)
+
+        target = self.max_bytes * 0.9
+        for mtime, size, path in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process evicted it first
+                pass
+            self.size -= size
+
+
+'''
+ResultCache
+
+thread safe LRU of response documents
+max_entries, max_bytes: size limits (bytes of the documents as JSON)
+ttl: seconds an entry stays valid, None for no expiry
+'''
+
+
+class ResultCache():
+
+    def __init__(self, max_entries: int = 256,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored, size, document)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    '''
+    KEY
+    '''
+
+    @staticmethod
+    def key(payload, *options) -> str:
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        digest = hashlib.sha256()
+        digest.update(ENGINE_VERSION.encode())
+        for option in options:
+            digest.update(json.dumps(option, sort_keys=True).encode())
+        digest.update(payload)
+        return digest.hexdigest()
+
+    '''
+    GET - (document, age in seconds) or None
+    '''
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None \
+                    and time.time() - entry[0] > self.ttl:
+                self.remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            stored, size, document = entry
+            return document, time.time() - stored
+
+    '''
+    PUT - the document must not be modified afterwards, it is shared
+    '''
+
+    def put(self, key: str, document: dict):
+        size = len(json.dumps(document))
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.time(), size, document)
+            self.size += size
+
+            while len(self.entries) > self.max_entries \
+                    or self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+
+    '''
+    REMOVE - call with the lock held
+    '''
+
+    def remove(self, key: str):
+        stored, size, document = self.entries.pop(key)
+        self.size -= size
+
+
+'''
+MemoryCache
+
+AnalysisCache interface (get/put per FunctionDef) kept in memory, for a
+long lived process. Optionally in front of an AnalysisCache, whose hits
+are promoted and which every put is written through to.
+max_entries, max_bytes: size limits of the in-memory tier
+'''
+
+
+class MemoryCache():
+
+    def __init__(self, max_entries: int = 4096,
+                 max_bytes: int = 128 * 1024 * 1024, disk=None):
+        self.results = ResultCache(max_entries, max_bytes, ttl=None)
+        self.disk = disk
+
+    '''
+    KEY - same inputs as AnalysisCache.key
+    '''
+
+    def key(self, body: ast.FunctionDef, options: dict = None) -> str:
+        return ResultCache.key(ast.dump(body, include_attributes=False),
+                               get_layout(body), options or {})
+
+    '''
+    GET
+    returns a FunctionResult or None on a miss
+    '''
+
+    def get(self, body: ast.FunctionDef, options: dict = None):
+        key = self.key(body, options)
+        cached = self.results.get(key)
+        if cached is not None:
+            result = FunctionResult.from_dict(cached[0], body.lineno)
+            result.cached = True
+            return result
+
+        if self.disk is None:
+            return None
+        result = self.disk.get(body, options)
+        if result is not None:
+            self.results.put(key, result.to_dict(body.lineno))
+        return result
+
+    '''
+    PUT
+    '''
+
+    def put(self, body: ast.FunctionDef, result: FunctionResult,
+            options: dict = None):
+        self.results.put(self.key(body, options), result.to_dict(body.lineno))
+        if self.disk is not None:
+            self.disk.put(body, result, options)
@@ -0,0 +1,830 @@
+'''
+
+Control flow graph IR of a function.
+
+lower() translates a FunctionDef once into basic blocks of operations,
+which the FunctionParser executes instead of re-interpreting the ast on
+every visit:
+ - statements are classified while lowering, an Op's kind selects the
+   parser handler. AugAssign is rewritten to Assign and loops over range()
+   to their counted while form here, not on every visit.
+ - every variable gets a slot (args first), the bindings of a state are a
+   list indexed by slot instead of a dict keyed by name
+ - expressions become templates: closures over the pre-resolved slots,
+   operator names and constants, called with the parser (env) to compute a
+   value or a branch test. Folding and the Z3 operators stay with the
+   parser's apply_* helpers, so cfg.py does not need z3.
+ - loops are explicit: a Loop holds the header test, the body block(s)
+   ending in a back edge (LatchOp) and the exit block where the paths
+   leaving the loop meet
+
+A block is a list of Ops run in order. Loop ops move the running state to
+the loop's exit block, running past the last op of a block ends the path.
+
+Ops and templates are immutable once lowered, so a CFG can be shared by
+every parser of the process: get_cfg keeps lowered functions per
+FunctionDef node for as long as the parsed tree is alive.
+
+'''
+import ast
+import threading
+import weakref
+
+# value of a slot whose variable is not bound on the path
+UNBOUND = object()
+
+
+'''
+GET_OP_TYPE
+name of an ast operator node, e.g. ast.Add() -> 'Add'
+'''
+
+
+def get_op_type(op: ast.AST) -> str:
+    return type(op).__name__
+
+
+'''
+NEVER - constraint of a test the engine does not support
+'''
+
+
+def never():
+    return False
+
+
+'''
+FAIL - template raising an error the ast interpreter raised at this point
+'''
+
+
+def fail(error: Exception):
+    def template(env):
+        raise error
+    return template
+
+
+'''
+Block - basic block, ops run in order
+'''
+
+
+class Block():
+
+    __slots__ = ('ops',)
+
+    def __init__(self, ops: list = None):
+        self.ops = ops if ops is not None else []
+
+
+'''
+Loop
+
+id: index of the loop in its CFG, keys ExecutionState.loops
+line: While statement (for loops: their counted while form)
+test: test template
+body: [LoopEntryOp, body..., LatchOp] when unrolled
+once: [CheckOp, body..., WalkedOp], the body walked once (no unrolling)
+revisit: [CheckOp], a loop whose body was walked already
+exit: block after the loop
+assigned: slots of the variables the body (nested loops included) assigns
+'''
+
+
+class Loop():
+
+    __slots__ = ('id', 'line', 'test', 'body', 'once', 'revisit', 'exit',
+                 'assigned')
+
+    def __init__(self, id: int, line: ast.stmt, test, assigned: list):
+        self.id = id
+        self.line = line
+        self.test = test
+        self.assigned = assigned
+        self.body = None
+        self.once = None
+        self.revisit = None
+        self.exit = Block()
+
+
+'''
+Op
+
+kind: FunctionParser handler (FunctionParser.handlers)
+line: statement the op was lowered from
+stmt: statements are covered and reported to the tracer when run, the ops
+      added by the lowering (checks, loop edges) are not
+'''
+
+
+class Op():
+
+    __slots__ = ('line', 'lineno')
+    kind = None
+    stmt = True
+
+    def __init__(self, line: ast.stmt):
+        self.line = line
+        self.lineno = line.lineno
+
+
+'''
+NoOp - statement without effect on the engine (return, calls, pass...)
+'''
+
+
+class NoOp(Op):
+
+    __slots__ = ()
+    kind = 'noop'
+
+
+'''
+ErrorOp - statement the ast interpreter failed on, fails when run
+'''
+
+
+class ErrorOp(Op):
+
+    __slots__ = ('error',)
+    kind = 'error'
+
+    def __init__(self, line: ast.stmt, error: Exception):
+        super().__init__(line)
+        self.error = error
+
+
+'''
+VarOp - AnnAssign, binds a fresh version of the annotated type
+'''
+
+
+class VarOp(Op):
+
+    __slots__ = ('name', 'slot', 'var_type', 'value')
+    kind = 'var'
+
+    def __init__(self, line: ast.AnnAssign, name: str, slot: int,
+                 var_type: str, value):
+        super().__init__(line)
+        self.name = name
+        self.slot = slot
+        self.var_type = var_type
+        self.value = value
+
+
+'''
+AssignOp
+Assign (and AugAssign as x = x op value)
+targets: slots, or the error a target which is not a name raises
+'''
+
+
+class AssignOp(Op):
+
+    __slots__ = ('targets', 'value')
+    kind = 'assign'
+
+    def __init__(self, line: ast.stmt, targets: list, value):
+        super().__init__(line)
+        self.targets = targets
+        self.value = value
+
+
+'''
+IfOp
+
+then_block: [body..., CheckOp], else_block: [CheckOp, orelse...] or None
+mergeable: both sides only assign, then_ops/else_ops are run in place by
+           --merge
+'''
+
+
+class IfOp(Op):
+
+    __slots__ = ('test', 'then_block', 'else_block', 'mergeable',
+                 'then_ops', 'else_ops')
+    kind = 'branch'
+
+    def __init__(self, line: ast.If, test):
+        super().__init__(line)
+        self.test = test
+        self.then_block = None
+        self.else_block = None
+        self.mergeable = False
+        self.then_ops = None
+        self.else_ops = None
+
+
+'''
+WhileOp - loop header reached from before the loop
+'''
+
+
+class WhileOp(Op):
+
+    __slots__ = ('loop', 'exit')
+    kind = 'while'
+
+    def __init__(self, line: ast.While, loop: Loop):
+        super().__init__(line)
+        self.loop = loop
+        self.exit = loop.exit
+
+
+'''
+ForOp
+
+loop over range(start, stop, step), loop is None for any other for loop.
+summary: (slot, value template, negated) per accumulation when the body
+         can be summarized, value None when the loop variable is added,
+         else None
+init/loop: the counted while form the body is unrolled with otherwise
+'''
+
+
+class ForOp(Op):
+
+    __slots__ = ('start', 'stop', 'step', 'target', 'summary', 'body_lines',
+                 'init', 'loop', 'exit')
+    kind = 'for'
+
+    def __init__(self, line: ast.For):
+        super().__init__(line)
+        self.start = None
+        self.stop = None
+        self.step = None
+        self.target = None
+        self.summary = None
+        self.body_lines = [sub_line.lineno for sub_line in line.body]
+        self.init = None
+        self.loop = None
+        self.exit = Block()
+
+
+'''
+CheckOp
+satisfiability check of the path entering an if/while body
+side: 'then', 'else' or 'loop', the branch of the statement it checks
+'''
+
+
+class CheckOp(Op):
+
+    __slots__ = ('side',)
+    kind = 'check'
+    stmt = False
+
+    def __init__(self, line: ast.stmt, side: str):
+        super().__init__(line)
+        self.side = side
+
+
+'''
+LoopOp - op added to the blocks of a loop
+'''
+
+
+class LoopOp(Op):
+
+    __slots__ = ('loop',)
+    stmt = False
+
+    def __init__(self, loop: Loop):
+        super().__init__(loop.line)
+        self.loop = loop
+
+
+'''
+LoopEntryOp - first op of an unrolled iteration (check_loop_entry)
+'''
+
+
+class LoopEntryOp(LoopOp):
+
+    __slots__ = ()
+    kind = 'loop_entry'
+
+
+'''
+LatchOp - back edge of an unrolled iteration to the loop header
+'''
+
+
+class LatchOp(LoopOp):
+
+    __slots__ = ()
+    kind = 'latch'
+
+
+'''
+WalkedOp - end of a body walked once, later visits only check the test
+'''
+
+
+class WalkedOp(LoopOp):
+
+    __slots__ = ()
+    kind = 'walked'
+
+
+'''
+CFG
+
+entry: first block of the function
+names: variable name of each slot, slots: name -> slot
+loops: number of loops
+'''
+
+
+class CFG():
+
+    def __init__(self, entry: Block, names: list, loops: int):
+        self.entry = entry
+        self.names = names
+        self.slots = {name: slot for slot, name in enumerate(names)}
+        self.loops = loops
+
+
+'''
+LOWER
+unroll: whether while loops are unrolled (--unroll) or walked once, the
+        blocks built for their bodies differ
+'''
+
+
+def lower(body: ast.FunctionDef, unroll: bool = False) -> CFG:
+    lowering = Lowering(unroll)
+    for arg in body.args.args:
+        lowering.slot(arg.arg)
+    entry = lowering.lower_block(body.body)
+    return CFG(entry, lowering.names, lowering.loops)
+
+
+'''
+Lowering - state of one lower() call
+'''
+
+
+class Lowering():
+
+    def __init__(self, unroll: bool):
+        self.unroll = unroll
+        self.names = []
+        self.slots = {}
+        self.loops = 0
+
+    '''
+    SLOT - slot of a variable, allocated on first use
+    '''
+
+    def slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    '''
+    NEW_LOOP
+    '''
+
+    def new_loop(self, line: ast.While) -> Loop:
+        assigned = sorted({self.slot(node.id)
+                           for sub_line in line.body
+                           for node in ast.walk(sub_line)
+                           if isinstance(node, ast.Name)
+                           and isinstance(node.ctx, ast.Store)})
+        loop = Loop(self.loops, line, self.compile_test(line.test), assigned)
+        self.loops += 1
+        return loop
+
+    '''
+    LOWER_BLOCK
+    statements into a chain of blocks, a loop ends the block it is in and
+    the following statements go to its exit block
+    head/tail: ops run before/after the statements
+    '''
+
+    def lower_block(self, stmts: list, head: list = (),
+                    tail: list = ()) -> Block:
+        entry = block = Block(list(head))
+        for stmt in stmts:
+            op = self.lower_stmt(stmt)
+            block.ops.append(op)
+            if isinstance(op, (WhileOp, ForOp)):
+                block = op.exit
+        block.ops.extend(tail)
+        return entry
+
+    '''
+    LOWER_STMT
+    '''
+
+    def lower_stmt(self, line: ast.stmt) -> Op:
+        try:
+            if isinstance(line, ast.AnnAssign):
+                return self.lower_var(line)
+            if isinstance(line, ast.Assign):
+                return self.lower_assign(line)
+            if isinstance(line, ast.AugAssign):
+                return self.lower_aug_assign(line)
+            if isinstance(line, ast.If):
+                return self.lower_if(line)
+            if isinstance(line, ast.While):
+                return self.lower_while(line)
+            if isinstance(line, ast.For):
+                return self.lower_for(line)
+        except AttributeError as ex:
+            # e.g. a target which is not a name, the statement fails when
+            # it is run like it did before lowering
+            return ErrorOp(line, ex)
+        return NoOp(line)
+
+    '''
+    LOWER_VAR
+    AnnAssign(expr target, expr annotation, expr? value, int simple)
+    '''
+
+    def lower_var(self, line: ast.AnnAssign) -> VarOp:
+        name = line.target.id
+        var_type = line.annotation.id
+        return VarOp(line, name, self.slot(name), var_type,
+                     self.compile_value(line.value))
+
+    '''
+    LOWER_ASSIGN
+    Assign(expr* targets, expr value, string? type_comment)
+    '''
+
+    def lower_assign(self, line: ast.Assign) -> AssignOp:
+        value = self.compile_value(line.value)
+        targets = []
+        for target in line.targets:
+            try:
+                targets.append(self.slot(target.id))
+            except AttributeError as ex:
+                targets.append(ex)
+        return AssignOp(line, targets, value)
+
+    '''
+    LOWER_AUG_ASSIGN - x op= value as x = x op value
+    '''
+
+    def lower_aug_assign(self, line: ast.AugAssign) -> AssignOp:
+        target = line.target
+        value = ast.BinOp(left=ast.Name(id=target.id, ctx=ast.Load()),
+                          op=line.op, right=line.value)
+        assign = ast.Assign(targets=[target],
+                            value=ast.copy_location(value, line))
+        return self.lower_assign(ast.copy_location(assign, line))
+
+    '''
+    LOWER_IF
+    If(expr test, stmt* body, stmt* orelse)
+    '''
+
+    def lower_if(self, line: ast.If) -> IfOp:
+        op = IfOp(line, self.compile_test(line.test))
+        then_check = CheckOp(line, 'then')
+        else_check = CheckOp(line, 'else')
+
+        # both sides only assign variables, so they have no effect besides
+        # the values they leave behind
+        op.mergeable = all(isinstance(sub_line,
+                                      (ast.Assign, ast.AnnAssign, ast.Pass))
+                           for sub_line in line.body + line.orelse)
+        if op.mergeable:
+            op.then_ops = [self.lower_stmt(sub_line) for sub_line in line.body]
+            op.else_ops = [self.lower_stmt(sub_line)
+                           for sub_line in line.orelse]
+            op.then_block = Block(op.then_ops + [then_check])
+            if line.orelse:
+                op.else_block = Block([else_check] + op.else_ops)
+            return op
+
+        op.then_block = self.lower_block(line.body, tail=[then_check])
+        if line.orelse:
+            op.else_block = self.lower_block(line.orelse, head=[else_check])
+        return op
+
+    '''
+    LOWER_WHILE
+    While(expr test, stmt* body, stmt* orelse)
+    '''
+
+    def lower_while(self, line: ast.While) -> WhileOp:
+        loop = self.new_loop(line)
+        if self.unroll:
+            self.lower_loop_body(loop)
+        else:
+            loop.once = self.lower_block(line.body,
+                                         head=[CheckOp(line, 'loop')],
+                                         tail=[WalkedOp(loop)])
+            loop.revisit = Block([CheckOp(line, 'loop')])
+        return WhileOp(line, loop)
+
+    '''
+    LOWER_LOOP_BODY - body of an unrolled iteration
+    '''
+
+    def lower_loop_body(self, loop: Loop):
+        loop.body = self.lower_block(loop.line.body, head=[LoopEntryOp(loop)],
+                                     tail=[LatchOp(loop)])
+
+    '''
+    LOWER_FOR
+    For(expr target, expr iter, stmt* body, stmt* orelse)
+    for x in range(start, stop, step) is summarized at run time when the
+    accumulators are bound, else executed as
+    x = start / while x < stop: body; x += step
+    '''
+
+    def lower_for(self, line: ast.For) -> ForOp:
+        op = ForOp(line)
+        range_args = get_range_args(line)
+        if range_args is None:
+            return op
+
+        start, stop, step = range_args
+        target = line.target.id
+        op.start = self.compile_value(start)
+        op.stop = self.compile_value(stop)
+        op.step = step
+        op.target = self.slot(target)
+        op.summary = self.lower_summary(line)
+
+        init = ast.Assign(targets=[ast.Name(id=target, ctx=ast.Store())],
+                          value=start)
+        op.init = self.lower_assign(ast.copy_location(init, line))
+
+        test = ast.Compare(left=ast.Name(id=target, ctx=ast.Load()),
+                           ops=[ast.Lt() if step > 0 else ast.Gt()],
+                           comparators=[stop])
+        increment = ast.AugAssign(target=ast.Name(id=target, ctx=ast.Store()),
+                                  op=ast.Add(), value=ast.Constant(step))
+        loop_line = ast.While(test=ast.copy_location(test, line),
+                              body=line.body + [ast.copy_location(increment,
+                                                                  line)],
+                              orelse=[])
+        loop = self.new_loop(ast.copy_location(loop_line, line))
+        loop.exit = op.exit
+        self.lower_loop_body(loop)
+        op.loop = loop
+        return op
+
+    '''
+    LOWER_SUMMARY
+    every statement of the body is an accumulation which does not depend on
+    the other accumulators, or has no effect on the engine (pass, calls),
+    else None. Increments must be integer arithmetic over names and int
+    constants. The accumulators and increments must also be bound to Ints
+    when the loop is reached, which is checked at run time.
+    '''
+
+    def lower_summary(self, line: ast.For):
+        if line.orelse:
+            return None
+
+        loop_var = line.target.id
+        accumulators = {sub_line.target.id for sub_line in line.body
+                        if isinstance(sub_line, ast.AugAssign)
+                        and isinstance(sub_line.target, ast.Name)}
+
+        summary = []
+        for sub_line in line.body:
+            if isinstance(sub_line, (ast.Pass, ast.Expr)):
+                continue
+
+            if not isinstance(sub_line, ast.AugAssign) \
+                    or not isinstance(sub_line.target, ast.Name) \
+                    or not isinstance(sub_line.op, (ast.Add, ast.Sub)):
+                return None
+
+            var_name = sub_line.target.id
+            if var_name == loop_var:
+                return None
+
+            names = {node.id for node in ast.walk(sub_line.value)
+                     if isinstance(node, ast.Name)}
+            if names & accumulators:
+                return None
+            if loop_var in names and not isinstance(sub_line.value, ast.Name):
+                return None
+            if not is_int_expr(sub_line.value):
+                return None
+
+            value = None if loop_var in names \
+                else self.compile_value(sub_line.value)
+            summary.append((self.slot(var_name), value,
+                            isinstance(sub_line.op, ast.Sub)))
+
+        return summary
+
+    '''
+    COMPILE_VALUE
+    template of the value of an expression: the bound value of a name
+    (concrete when known), a constant, or an operation over them
+    '''
+
+    def compile_value(self, expr: ast.expr):
+        if isinstance(expr, ast.Name):
+            slot = self.slot(expr.id)
+            return lambda env: env.get_binding(slot)
+
+        if isinstance(expr, ast.Constant):
+            value = expr.value
+            return lambda env: value
+
+        if isinstance(expr, ast.BinOp):
+            left = self.compile_value(expr.left)
+            right = self.compile_value(expr.right)
+            op_type = get_op_type(expr.op)
+            return lambda env: env.apply_binop(op_type, left(env), right(env))
+
+        if isinstance(expr, ast.UnaryOp):
+            operand = self.compile_value(expr.operand)
+            op_type = get_op_type(expr.op)
+            return lambda env: env.apply_unaryop(op_type, operand(env))
+
+        return lambda env: None
+
+    '''
+    COMPILE_TEST
+    template of an If/While test: a Z3 expression, a bool, or a callable
+    producing the expression when the constraint is used
+    '''
+
+    def compile_test(self, test: ast.expr):
+        if isinstance(test, ast.Name):
+            slot = self.slot(test.id)
+            return lambda env: env.get_test(slot)
+
+        if isinstance(test, (ast.UnaryOp, ast.BoolOp)):
+            op_type = get_op_type(test.op)
+            operands = self.compile_operands(test)
+            return lambda env: env.apply_op(
+                op_type, [operand(env) for operand in operands])
+
+        if isinstance(test, ast.Compare):
+            return self.compile_compare(test)
+
+        return lambda env: never
+
+    '''
+    COMPILE_COMPARE - only the first comparison of a chain is supported
+    '''
+
+    def compile_compare(self, test: ast.Compare):
+        op_type = get_op_type(test.ops[0])
+        comparator = self.compile_value(test.comparators[0])
+        left = self.compile_value(test.left)
+
+        def compare(env):
+            op_value = comparator(env)
+            return env.apply_compare(op_type, left(env), op_value)
+        return compare
+
+    '''
+    COMPILE_OPERANDS
+    operand templates of a BoolOp, or of a UnaryOp over a name, the names
+    stand for their Z3 constants here
+    '''
+
+    def compile_operands(self, test: ast.expr) -> list:
+        if isinstance(test, ast.BoolOp):
+            return [self.compile_operand(value) for value in test.values]
+
+        if isinstance(test, ast.UnaryOp):
+            try:
+                slot = self.slot(test.operand.id)
+            except AttributeError as ex:
+                return [fail(ex)]
+            return [lambda env: env.get_var(slot)]
+
+        return []
+
+    '''
+    COMPILE_OPERAND
+    '''
+
+    def compile_operand(self, value: ast.expr):
+        if isinstance(value, ast.Compare):
+            return self.compile_compare(value)
+
+        if isinstance(value, ast.UnaryOp):
+            op_type = get_op_type(value.op)
+            try:
+                slot = self.slot(value.operand.id)
+            except AttributeError as ex:
+                return fail(ex)
+            return lambda env: env.apply_op(op_type, [env.find_var(slot)])
+
+        if hasattr(value, 'op'):
+            op_type = get_op_type(value.op)
+            operands = self.compile_operands(value)
+            return lambda env: env.apply_op(
+                op_type, [[operand(env) for operand in operands]])
+
+        if isinstance(value, ast.Name):
+            slot = self.slot(value.id)
+            return lambda env: env.get_var(slot)
+
+        return lambda env: None
+
+
+'''
+GET_RANGE_ARGS
+(start, stop, step) of a loop over range(), start and stop as ast
+expressions, step as a non zero int, or None
+'''
+
+
+def get_range_args(line: ast.For):
+    call = line.iter
+    if not isinstance(line.target, ast.Name) \
+            or not isinstance(call, ast.Call) \
+            or not isinstance(call.func, ast.Name) \
+            or call.func.id != 'range' \
+            or call.keywords or not 1 <= len(call.args) <= 3:
+        return None
+
+    args = call.args
+    start = args[0] if len(args) > 1 else ast.Constant(0)
+    stop = args[1] if len(args) > 1 else args[0]
+    step = 1
+    if len(args) == 3:
+        try:
+            step = ast.literal_eval(args[2])
+        except ValueError:
+            return None
+        if not isinstance(step, int) or step == 0:
+            return None
+
+    return start, stop, step
+
+
+'''
+IS_INT_EXPR
+integer arithmetic (+, -, *, unary -/+) over names and int constants
+'''
+
+
+def is_int_expr(expr: ast.expr) -> bool:
+    if isinstance(expr, ast.Name):
+        return True
+    if isinstance(expr, ast.Constant):
+        return type(expr.value) is int
+    if isinstance(expr, ast.BinOp):
+        return isinstance(expr.op, (ast.Add, ast.Sub, ast.Mult)) \
+            and is_int_expr(expr.left) and is_int_expr(expr.right)
+    if isinstance(expr, ast.UnaryOp):
+        return isinstance(expr.op, (ast.USub, ast.UAdd)) \
+            and is_int_expr(expr.operand)
+    return False
+
+
+'''
+CFGCache
+lowered functions per FunctionDef node and loop mode. Nodes are held
+weakly (a CFG only refers to the statements inside the def), so an entry
+is dropped with the tree it was parsed in. Hashing the ast instead costs
+more than lowering it again.
+'''
+
+
+class CFGCache():
+
+    def __init__(self):
+        self.entries = weakref.WeakKeyDictionary()  # body -> {unroll: CFG}
+        self.stats = {'hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+
+    '''
+    GET - the CFG of a function, lowered on a miss
+    '''
+
+    def get(self, body: ast.FunctionDef, unroll: bool = False) -> CFG:
+        with self.lock:
+            cfg = self.entries.get(body, {}).get(unroll)
+            if cfg is not None:
+                self.stats['hits'] += 1
+                return cfg
+
+        cfg = lower(body, unroll)
+        with self.lock:
+            self.stats['misses'] += 1
+            self.entries.setdefault(body, {})[unroll] = cfg
+        return cfg
+
+
+cache = CFGCache()
+
+
+'''
+GET_CFG - lowered function from the process wide cache
+'''
+
+
+def get_cfg(body: ast.FunctionDef, unroll: bool = False) -> CFG:
+    return cache.get(body, unroll)
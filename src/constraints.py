@@ -0,0 +1,73 @@
+'''
+
+Persistent path condition.
+
+The constraint set of a path is an immutable, append-only linked list of
+(key, constraint) entries. Adding a constraint returns a new PathCondition
+that shares every earlier entry with its parent, so forking a path at a
+branch is just keeping a reference and restoring it is re-assigning that
+reference, both O(1) with no copying of Z3 expressions.
+
+Keys follow the dict the engine used before: named entries (variables)
+replace the constraint stored under the same name, anonymous entries
+(branch tests) get the next integer index.
+
+'''
+
+
+class PathCondition():
+
+    __slots__ = ('parent', 'key', 'value', 'next_index', 'size')
+
+    def __init__(self, parent=None, key=None, value=None):
+        self.parent = parent
+        self.key = key
+        self.value = value
+
+        if parent is None:
+            self.next_index = 0
+            self.size = 0
+        else:
+            self.next_index = parent.next_index + isinstance(key, int)
+            self.size = parent.size + 1
+
+    '''
+    SET - constraint stored under a name, replacing an earlier one
+    '''
+
+    def set(self, key, value):
+        return PathCondition(self, key, value)
+
+    '''
+    APPEND - anonymous constraint, keyed by the next free index
+    '''
+
+    def append(self, value):
+        return PathCondition(self, self.next_index, value)
+
+    '''
+    ITEMS
+    (key, constraint) pairs in first-insertion order, a re-assigned key
+    keeps its position but carries its latest constraint
+    '''
+
+    def items(self):
+        nodes = []
+        node = self
+        while node.parent is not None:
+            nodes.append(node)
+            node = node.parent
+
+        entries = {}
+        for node in reversed(nodes):
+            entries[node.key] = node.value
+        return entries.items()
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def __len__(self):
+        return len(self.items())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
@@ -0,0 +1,302 @@
+'''
+
+Local analysis daemon.
+
+A long lived process listening on a Unix socket, so the CLI does not pay
+for interpreter start, the z3 import and cold caches on every run. It keeps
+Z3 and the z3tools operator tables loaded, per-function results in a
+MemoryCache (optionally backed by an on-disk AnalysisCache) and whole
+file results in a ResultCache.
+
+main.py submits a file when the socket exists and falls back to analyzing
+in-process when no daemon answers, when it answers with an error or when
+it runs another engine version.
+
+Protocol: one JSON request line per connection, answered by one JSON line.
+    {"op": "analyze", "filename": ..., "source": ..., "options": {...}}
+        -> {"engine_version": ..., "results": [FunctionResult.to_dict()],
+            "timings": {...}, "cached": bool}
+    {"op": "ping"} -> {"engine_version": ..., "pid": ..., "stats": {...}}
+    {"op": "shutdown"} -> {"ok": true}
+Requests are served one at a time, Z3 is not used from several threads.
+
+usage: python src/daemon.py [--socket PATH] [--cache-dir DIR]
+       python src/daemon.py --status | --stop
+
+'''
+import argparse
+import ast
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from symbex import ENGINE_VERSION, FunctionParser, FunctionResult, \
+    ModuleParser
+from cache import AnalysisCache, MemoryCache, ResultCache
+
+
+# socket used by the daemon and the CLI unless told otherwise
+DEFAULT_SOCKET = os.environ.get('SYMBEX_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"symbex-{getattr(os, 'getuid', lambda: 0)()}.sock")
+
+# seconds the CLI waits to connect before analyzing in-process
+CONNECT_TIMEOUT = 0.5
+# largest request accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# whole file results kept by the daemon
+DOCUMENT_CACHE_ENTRIES = 512
+DOCUMENT_CACHE_BYTES = 64 * 1024 * 1024
+
+# analyzed once at startup, so the first real request finds Z3 warm
+WARMUP_SOURCE = '''
+def warmup(a: int, b: bool, s: str) -> int:
+    if a > 0 and b:
+        return 1
+    elif s == 'x':
+        return 2
+    return 0
+'''
+
+
+'''
+REQUEST - send one request to the daemon, raises OSError/ValueError
+'''
+
+
+def request(socket_path: str, message: dict, timeout: float = None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(socket_path)
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        with sock.makefile('rb') as reply:
+            line = reply.readline()
+    return json.loads(line)
+
+
+'''
+PING - the daemon's status, None when none is listening
+'''
+
+
+def ping(socket_path: str = DEFAULT_SOCKET):
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    try:
+        return request(socket_path, {'op': 'ping'}, CONNECT_TIMEOUT)
+    except (OSError, ValueError):
+        return None
+
+
+'''
+SUBMIT
+analyze a file on the daemon, returns (FunctionResults, AST timings) or
+None when the caller should analyze it in-process
+'''
+
+
+def submit(socket_path: str, filename: str, options: dict = None):
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+
+    try:
+        with open(filename) as source_file:
+            source = source_file.read()
+    except OSError:
+        return None
+
+    try:
+        response = request(socket_path, {'op': 'analyze', 'filename': filename,
+                                         'source': source,
+                                         'options': options or {}})
+    except (OSError, ValueError) as ex:
+        print(f"daemon unavailable ({ex}), analyzing in-process",
+              file=sys.stderr)
+        return None
+
+    if 'error' in response:
+        return None
+    if response.get('engine_version') != ENGINE_VERSION:
+        print(f"daemon runs engine {response.get('engine_version')}, "
+              f"not {ENGINE_VERSION}, analyzing in-process", file=sys.stderr)
+        return None
+
+    results = [FunctionResult.from_dict(record)
+               for record in response['results']]
+    if response.get('cached'):
+        for result in results:
+            result.cached = True
+    return results, response['timings']
+
+
+'''
+RequestHandler - one request line, one response line
+'''
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline(MAX_REQUEST_BYTES))
+            response = self.server.dispatch(message)
+        except Exception as ex:
+            self.server.stats['errors'] += 1
+            response = {'error': repr(ex)}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+'''
+AnalysisDaemon
+
+jobs: worker processes used per file (1 analyzes in the daemon itself)
+cache: per-function cache (MemoryCache)
+'''
+
+
+class AnalysisDaemon(socketserver.UnixStreamServer):
+
+    def __init__(self, socket_path: str, jobs: int = 1, cache=None):
+        self.socket_path = socket_path
+        self.jobs = jobs
+        self.cache = cache
+        self.documents = ResultCache(DOCUMENT_CACHE_ENTRIES,
+                                     DOCUMENT_CACHE_BYTES, ttl=None)
+        self.started = time.time()
+        self.stats = {'requests': 0, 'hits': 0, 'analyzed': 0, 'errors': 0}
+
+        # only this user may connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+    '''
+    WARM - load Z3 and z3tools and run a throwaway analysis
+    '''
+
+    def warm(self):
+        parser = ModuleParser(WARMUP_SOURCE)
+        parser.parse()
+
+    '''
+    DISPATCH
+    '''
+
+    def dispatch(self, message: dict) -> dict:
+        op = message.get('op')
+        if op == 'analyze':
+            return self.analyze(message['source'],
+                                message.get('options') or {})
+        if op == 'ping':
+            return {'engine_version': ENGINE_VERSION, 'pid': os.getpid(),
+                    'uptime': time.time() - self.started,
+                    'jobs': self.jobs, 'stats': self.stats}
+        if op == 'shutdown':
+            # shutdown() waits for serve_forever, which is running this
+            threading.Thread(target=self.shutdown).start()
+            return {'ok': True}
+        return {'error': f"unknown op: {op}"}
+
+    '''
+    ANALYZE - same results as a FileParser of the source
+    '''
+
+    def analyze(self, source: str, options: dict) -> dict:
+        self.stats['requests'] += 1
+        key = ResultCache.key(source, options)
+        cached = self.documents.get(key)
+        if cached is not None:
+            self.stats['hits'] += 1
+            return {**cached[0], 'cached': True}
+
+        try:
+            ast.parse(source)
+        except SyntaxError as ex:
+            return {'error': str(ex)}
+
+        parser: ModuleParser = ModuleParser(source, self.jobs, self.cache,
+                                            options)
+        parser.parse()
+        results = [func.result() if isinstance(func, FunctionParser) else func
+                   for func in parser.functions]
+        self.stats['analyzed'] += 1
+
+        document = {'engine_version': ENGINE_VERSION,
+                    'results': [result.to_dict() for result in results],
+                    'timings': parser.timings}
+        self.documents.put(key, document)
+        return {**document, 'cached': False}
+
+
+'''
+SERVE - run a daemon until it is stopped, returns the exit status
+'''
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, jobs: int = 1,
+          cache_dir: str = None, cache_size: int = 256) -> int:
+    if os.path.exists(socket_path):
+        if ping(socket_path) is not None:
+            print(f"a daemon is already listening on {socket_path}")
+            return 1
+        # left behind by a daemon which did not exit cleanly
+        os.remove(socket_path)
+
+    disk = None
+    if cache_dir:
+        disk = AnalysisCache(cache_dir, cache_size * 1024 * 1024)
+    server = AnalysisDaemon(socket_path, jobs, MemoryCache(disk=disk))
+
+    # SIGTERM unwinds serve_forever like Ctrl-C, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.warm()
+        print(f"listening on {socket_path}", flush=True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='keep the analysis engine warm for the CLI')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET,
+                        help=f"Unix socket to listen on (default {DEFAULT_SOCKET}, or $SYMBEX_SOCKET)")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='worker processes used per file (0 = all cores)')
+    parser.add_argument('--cache-dir',
+                        help='also keep function results in this on-disk analysis cache')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='on-disk analysis cache size limit in MB')
+    parser.add_argument('--status', action='store_true',
+                        help='print the status of the running daemon')
+    parser.add_argument('--stop', action='store_true',
+                        help='stop the running daemon')
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        status = ping(args.socket)
+        if status is None:
+            print(f"no daemon listening on {args.socket}")
+            sys.exit(1)
+        if args.stop:
+            request(args.socket, {'op': 'shutdown'}, CONNECT_TIMEOUT)
+        print(json.dumps(status, indent=2))
+        sys.exit(0)
+
+    sys.exit(serve(args.socket, args.jobs, args.cache_dir, args.cache_size))
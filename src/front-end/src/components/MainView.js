@@ -31,7 +31,8 @@ export const MainView = () => {
 
     const run = () => {
         console.log(formValues.payLoad)
-        const url = `http://${serverAddr}:${serverPort}/run`;
+        // the AST is only sent when asked for
+        const url = `http://${serverAddr}:${serverPort}/run?ast=pretty`;
         fetch(url, {
             method: "POST",
             body: formValues.payLoad,
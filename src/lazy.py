@@ -0,0 +1,36 @@
+'''
+
+Deferred imports.
+
+lazy_import hands back a module whose code only runs when one of its
+attributes is first used (importlib.util.LazyLoader), so heavy modules
+like z3 cost nothing to processes which never need them: --help, runs
+answered from the analysis cache, the parent of a process pool.
+
+Module level code of the importing module must not touch the lazy module,
+or it is loaded right away.
+
+'''
+import importlib.util
+import sys
+
+
+'''
+LAZY_IMPORT
+'''
+
+
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
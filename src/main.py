@@ -1,21 +1,117 @@
 from os import path
 import argparse
-from symbex import FileParser
+import json
+import sys
+from symbex import FileParser, FunctionParser
+from batch import run_batch
+from cache import AnalysisCache
+from search import STRATEGIES
+import metrics
+from tracer import PrintTracer
+import daemon
 
 
 parser = argparse.ArgumentParser('Static Parser - ')
 parser.add_argument('--filename', '--f', '-f',
                     default="test-cases/testbools.py")
-args = parser.parse_args()
-print(args)
+parser.add_argument('--jobs', '-j', type=int, default=1,
+                    help='worker processes used to analyze functions (0 = all cores)')
+parser.add_argument('--batch', nargs='+', metavar='PATH',
+                    help='directories, globs or files to analyze; writes one JSON line per function')
+parser.add_argument('--output', '-o',
+                    help='batch mode output file (default stdout)')
+parser.add_argument('--cache-dir',
+                    help='directory of the persistent analysis cache (disabled if not set)')
+parser.add_argument('--cache-size', type=int, default=256,
+                    help='analysis cache size limit in MB')
+parser.add_argument('--merge', action='store_true',
+                    help='merge assignment-only if/else branches instead of exploring each side')
+parser.add_argument('--strategy', choices=STRATEGIES, default='dfs',
+                    help='order in which pending branches are explored')
+parser.add_argument('--seed', type=int,
+                    help='random seed of the random strategy')
+parser.add_argument('--max-paths', type=int,
+                    help='stop exploring a function after this many paths')
+parser.add_argument('--max-depth', type=int,
+                    help='do not explore branches nested deeper than this')
+parser.add_argument('--time-budget', type=float,
+                    help='wall-clock seconds allowed per function')
+parser.add_argument('--query-timeout', type=float,
+                    help='seconds a single solver query may take before it is reported undecided')
+parser.add_argument('--rlimit', type=int,
+                    help='Z3 resource limit per function')
+parser.add_argument('--unroll', type=int,
+                    help='unroll while loops up to this many iterations')
+parser.add_argument('--print-ast', action='store_true',
+                    help='print the JSON AST of the file before analyzing it')
+parser.add_argument('--trace', action='store_true',
+                    help='print every line, branch, solver query, path and violation to stderr (analyzes in this process)')
+parser.add_argument('--daemon', metavar='SOCKET', default=daemon.DEFAULT_SOCKET,
+                    help='submit the file to the analysis daemon listening on this socket when one is running (see src/daemon.py)')
+parser.add_argument('--no-daemon', action='store_true',
+                    help='always analyze in this process (also implied by --trace and --print-ast)')
+parser.add_argument('--metrics', metavar='FILE',
+                    help='write per function/line work counters and timers as JSON (- for stdout)')
 
 
-# sanitize input...
-filename: str = args.filename
+# guard the entry point, worker processes re-import this module
+if __name__ == '__main__':
+    args = parser.parse_args()
 
-# parse file
+    # FunctionParser analysis options
+    options: dict = {}
+    if args.merge:
+        options['merge'] = True
+    if args.strategy != 'dfs':
+        options['strategy'] = args.strategy
+    for option in ['seed', 'max_paths', 'max_depth', 'time_budget',
+                   'query_timeout', 'rlimit', 'unroll']:
+        if getattr(args, option) is not None:
+            options[option] = getattr(args, option)
 
-parser: FileParser = FileParser(filename)
-parser.print_ast()
-parser.parse()
-parser.results()
+    cache = None
+    if args.cache_dir:
+        cache = AnalysisCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if args.batch:
+        out = open(args.output, 'w') if args.output else sys.stdout
+        run_batch(args.batch, out, jobs=args.jobs, cache=cache,
+                  options=options)
+        sys.exit(0)
+
+    print(args)
+
+    # sanitize input...
+    filename: str = args.filename
+
+    # a running daemon analyzes the file with warm caches, the tracer and
+    # the AST printer need the parser in this process
+    attached = None
+    if not (args.no_daemon or args.trace or args.print_ast):
+        attached = daemon.submit(args.daemon, filename, options)
+
+    if attached is not None:
+        results, timings = attached
+        for result in results:
+            result.debug()
+    else:
+        # parse file
+        tracer = PrintTracer() if args.trace else None
+        parser: FileParser = FileParser(filename, jobs=args.jobs, cache=cache,
+                                        options=options, tracer=tracer)
+        if args.print_ast:
+            parser.print_ast()
+        parser.parse()
+        parser.results()
+
+        results = [func.result() if isinstance(func, FunctionParser) else func
+                   for func in parser.functions]
+        timings = parser.timings
+
+    if args.metrics:
+        report = metrics.report(filename, timings, results)
+        if args.metrics == '-':
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.metrics, 'w') as out:
+                json.dump(report, out, indent=2)
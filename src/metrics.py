@@ -0,0 +1,320 @@
+'''
+
+Work counters of the engine.
+
+FunctionMetrics is filled in by a FunctionParser while it explores: per
+source line the solver calls (queries), the Z3 checks they needed and the
+ones the query caches answered, solver time and their outcomes, forks and
+the states they spawned; per function the constraint-set sizes sent to the
+solver. It travels with the FunctionResult (picklable, JSON friendly), so
+results of worker processes and of the cache carry it too.
+
+Registry aggregates finished functions of a long running process (the web
+service) per module and function, and renders them in the Prometheus text
+exposition format.
+
+'''
+import threading
+
+
+# per line counters, in to_dict order
+LINE_COUNTERS = ('solver_calls', 'z3_checks', 'cached_queries',
+                 'solver_time', 'sat', 'unsat', 'unknown', 'decided', 'forks',
+                 'states')
+
+
+'''
+FunctionMetrics
+'''
+
+
+class FunctionMetrics():
+
+    def __init__(self):
+        self.lines = {}  # lineno -> counters
+        self.solver_time = 0.0
+        self.constraints = 0  # summed constraint-set size of solver calls
+        self.max_constraints = 0
+        self.forks = 0
+        self.states = 0
+
+    '''
+    LINE - counters of a line, created on first use
+    '''
+
+    def line(self, lineno: int) -> dict:
+        counters = self.lines.get(lineno)
+        if counters is None:
+            counters = self.lines[lineno] = dict.fromkeys(LINE_COUNTERS, 0)
+            counters['solver_time'] = 0.0
+        return counters
+
+    '''
+    RECORD_SOLVE
+    result: 'sat', 'unsat' or 'unknown', size: constraints on the path,
+    checks: Solver.check invocations the query took, 0 when a cache (or
+    the trivial check) answered it
+    '''
+
+    def record_solve(self, lineno: int, result: str, elapsed: float,
+                     size: int, checks: int):
+        counters = self.line(lineno)
+        counters['solver_calls'] += 1
+        counters['z3_checks'] += checks
+        if checks == 0:
+            counters['cached_queries'] += 1
+        counters['solver_time'] += elapsed
+        counters[result] += 1
+
+        self.solver_time += elapsed
+        self.constraints += size
+        if size > self.max_constraints:
+            self.max_constraints = size
+
+    '''
+    RECORD_DECIDED - a branch settled without asking the solver
+    '''
+
+    def record_decided(self, lineno: int):
+        self.line(lineno)['decided'] += 1
+
+    '''
+    RECORD_FORK - a statement spawned new states
+    '''
+
+    def record_fork(self, lineno: int, states: int):
+        counters = self.line(lineno)
+        counters['forks'] += 1
+        counters['states'] += states
+        self.forks += 1
+        self.states += states
+
+    '''
+    TO DICT - JSON friendly record
+    base_lineno: subtracted from line numbers, to store them relative
+    '''
+
+    def to_dict(self, base_lineno: int = 0) -> dict:
+        return {
+            'solver_time': self.solver_time,
+            'constraints': self.constraints,
+            'max_constraints': self.max_constraints,
+            'forks': self.forks,
+            'states': self.states,
+            'lines': {str(lineno - base_lineno): counters
+                      for lineno, counters in sorted(self.lines.items())},
+        }
+
+    '''
+    FROM DICT - inverse of to_dict
+    '''
+
+    @staticmethod
+    def from_dict(record: dict, base_lineno: int = 0):
+        metrics = FunctionMetrics()
+        if not record:
+            return metrics
+
+        metrics.solver_time = record['solver_time']
+        metrics.constraints = record['constraints']
+        metrics.max_constraints = record['max_constraints']
+        metrics.forks = record['forks']
+        metrics.states = record['states']
+        metrics.lines = {int(lineno) + base_lineno: dict(counters)
+                         for lineno, counters in record['lines'].items()}
+        return metrics
+
+
+'''
+Registry
+
+process wide totals per (module, function). Once max_series - 1 series
+exist, any other function, of any module, is added up under the series
+module="_other", function="_other". The module label comes from clients,
+so the exposition stays bounded by max_series whatever they send.
+'''
+
+
+# series every function past the max_series cap is added up under
+OVERFLOW_SERIES = ('_other', '_other')
+
+
+# counter name -> help text, values summed over analyzed functions
+COUNTERS = {
+    'functions': 'Functions analyzed (cached results excluded).',
+    'cache_hits': 'Functions answered from a cache.',
+    'solver_calls': 'Solver queries issued.',
+    'z3_checks': 'Z3 Solver.check invocations made by solver queries.',
+    'cached_queries': 'Solver queries answered without calling Z3 (query caches, trivially unsat).',
+    'solver_seconds': 'Seconds spent in solver queries.',
+    'sat': 'Solver queries answered sat.',
+    'unsat': 'Branches found unsatisfiable, by the solver or decided.',
+    'unknown': 'Solver queries given up on (timeout/rlimit).',
+    'paths': 'Execution paths explored to the end.',
+    'forks': 'Statements which forked the running state.',
+    'states': 'States spawned by forks.',
+    'constraints': 'Constraint-set sizes summed over solver queries.',
+    'analysis_seconds': 'Wall-clock seconds spent exploring functions.',
+}
+
+
+class Registry():
+
+    def __init__(self, max_series: int = 1000):
+        self.max_series = max_series
+        self.series = {}  # (module, function) -> counters
+        self.max_constraints = {}  # (module, function) -> largest set
+        self.ast_seconds = {'parse': 0.0, 'json': 0.0}
+        self.modules = 0
+        self.lock = threading.Lock()
+
+    '''
+    OBSERVE - add up a FunctionResult of the given module
+    '''
+
+    def observe(self, module: str, result):
+        with self.lock:
+            key = (module, result.name)
+            if key not in self.series \
+                    and len(self.series) >= self.max_series - 1:
+                key = OVERFLOW_SERIES
+            counters = self.series.get(key)
+            if counters is None:
+                counters = self.series[key] = dict.fromkeys(COUNTERS, 0)
+
+            if result.cached:
+                counters['cache_hits'] += 1
+                return
+
+            stats = result.stats
+            metrics = result.metrics
+            counters['functions'] += 1
+            counters['solver_calls'] += stats['solver_calls']
+            counters['z3_checks'] += stats['z3_checks']
+            counters['cached_queries'] += stats['cached_queries']
+            counters['solver_seconds'] += metrics.solver_time
+            counters['sat'] += stats['sat']
+            counters['unsat'] += stats['unsat']
+            counters['unknown'] += stats['unknown']
+            counters['paths'] += stats['paths']
+            counters['forks'] += metrics.forks
+            counters['states'] += metrics.states
+            counters['constraints'] += metrics.constraints
+            counters['analysis_seconds'] += stats['time']
+            self.max_constraints[key] = max(self.max_constraints.get(key, 0),
+                                            metrics.max_constraints)
+
+    '''
+    OBSERVE_MODULE - AST conversion timings of a ModuleParser
+    '''
+
+    def observe_module(self, timings: dict):
+        with self.lock:
+            self.modules += 1
+            for stage, seconds in timings.items():
+                self.ast_seconds[stage] = self.ast_seconds.get(stage, 0.0) \
+                    + seconds
+
+    '''
+    PROMETHEUS - text exposition format
+    '''
+
+    def prometheus(self, prefix: str = 'symbex') -> str:
+        with self.lock:
+            series = sorted(self.series.items())
+            max_constraints = dict(self.max_constraints)
+            ast_seconds = sorted(self.ast_seconds.items())
+            modules = self.modules
+
+        lines = []
+        for name, help_text in COUNTERS.items():
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for (module, function), counters in series:
+                lines.append(f"{metric}{format_labels(module=module, function=function)} "
+                             f"{format_value(counters[name])}")
+
+        metric = f"{prefix}_max_constraints"
+        lines.append(f"# HELP {metric} Largest constraint set sent to the solver.")
+        lines.append(f"# TYPE {metric} gauge")
+        for (module, function), size in sorted(max_constraints.items()):
+            lines.append(f"{metric}{format_labels(module=module, function=function)} "
+                         f"{size}")
+
+        metric = f"{prefix}_modules_total"
+        lines.append(f"# HELP {metric} Modules parsed.")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {modules}")
+
+        metric = f"{prefix}_ast_seconds_total"
+        lines.append(f"# HELP {metric} Seconds spent parsing source and converting ASTs to JSON.")
+        lines.append(f"# TYPE {metric} counter")
+        for stage, seconds in ast_seconds:
+            lines.append(f"{metric}{format_labels(stage=stage)} "
+                         f"{format_value(seconds)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+'''
+FORMAT_LABELS - {name="value",...} with the exposition format escapes
+'''
+
+
+def format_labels(**labels) -> str:
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()) + '}'
+
+
+'''
+FORMAT_VALUE
+'''
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+'''
+REPORT
+JSON friendly metrics of an analyzed file, for the CLI
+timings: AST conversion timings of the FileParser
+results: FunctionResults
+'''
+
+
+def report(filename: str, timings: dict, results: list) -> dict:
+    functions = []
+    for result in results:
+        functions.append({
+            'function': result.name,
+            'cached': result.cached,
+            'stats': result.stats,
+            **result.metrics.to_dict(),
+        })
+
+    totals = dict.fromkeys(['solver_calls', 'z3_checks', 'cached_queries',
+                            'sat', 'unsat', 'unknown', 'paths', 'forks',
+                            'states'], 0)
+    totals['solver_time'] = 0.0
+    totals['time'] = 0.0
+    for result in results:
+        for name in ['solver_calls', 'z3_checks', 'cached_queries', 'sat',
+                     'unsat', 'unknown', 'paths']:
+            totals[name] += result.stats[name]
+        totals['forks'] += result.metrics.forks
+        totals['states'] += result.metrics.states
+        totals['solver_time'] += result.metrics.solver_time
+        totals['time'] += result.stats['time']
+
+    return {
+        'file': filename,
+        'ast': timings,
+        'totals': totals,
+        'functions': functions,
+    }
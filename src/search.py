@@ -0,0 +1,188 @@
+'''
+
+Search strategies for the FunctionParser's exploration.
+
+The parser no longer recurses into branches, every branch becomes an
+ExecutionState (where it is in the function's CFG plus the path condition)
+which is handed to a SearchStrategy. The strategy decides which pending state
+runs next.
+
+'''
+import random
+from collections import deque
+from cfg import LatchOp
+
+
+'''
+ExecutionState
+
+block, pc: CFG block (cfg.py) the state runs in and index of its next op
+constraints: PathCondition of the path
+vars: Z3 constant currently bound to each variable slot on this path
+depth: number of enclosing branches/loops
+loops: loop id -> iteration of the unrolled loops the state is in, shared
+       between states until a loop is entered
+'''
+
+
+class ExecutionState():
+
+    __slots__ = ('block', 'pc', 'constraints', 'vars', 'depth', 'loops')
+
+    def __init__(self, block, pc: int, constraints, vars: list,
+                 depth: int = 0, loops: dict = None):
+        self.block = block
+        self.pc = pc
+        self.constraints = constraints
+        self.vars = vars
+        self.depth = depth
+        self.loops = loops if loops is not None else {}
+
+    '''
+    NEXT LINE - line number of the next statement this state will run
+    '''
+
+    def next_line(self):
+        block, pc = self.block, self.pc
+        while True:
+            ops = block.ops[pc:]
+            for op in ops:
+                if op.stmt:
+                    return op.lineno
+
+            # past the back edge of a loop the code after the loop runs next
+            if not ops or not isinstance(ops[-1], LatchOp):
+                return None
+            block, pc = ops[-1].loop.exit, 0
+
+
+'''
+SearchStrategy
+
+states are added in source order: then-branch, else-branch, continuation
+'''
+
+
+class SearchStrategy():
+
+    def add(self, states: list):
+        raise NotImplementedError
+
+    def pop(self) -> ExecutionState:
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+'''
+DepthFirst - the classic recursive walk: a branch is finished before its
+siblings and the code after it
+'''
+
+
+class DepthFirst(SearchStrategy):
+
+    def __init__(self):
+        self.states = []
+
+    def add(self, states: list):
+        self.states.extend(reversed(states))
+
+    def pop(self) -> ExecutionState:
+        return self.states.pop()
+
+    def __len__(self):
+        return len(self.states)
+
+
+'''
+BreadthFirst - shallow branches first
+'''
+
+
+class BreadthFirst(SearchStrategy):
+
+    def __init__(self):
+        self.states = deque()
+
+    def add(self, states: list):
+        self.states.extend(states)
+
+    def pop(self) -> ExecutionState:
+        return self.states.popleft()
+
+    def __len__(self):
+        return len(self.states)
+
+
+'''
+RandomPath - uniformly random pending state, reproducible with a seed
+'''
+
+
+class RandomPath(SearchStrategy):
+
+    def __init__(self, seed=None):
+        self.states = []
+        self.random = random.Random(seed)
+
+    def add(self, states: list):
+        self.states.extend(states)
+
+    def pop(self) -> ExecutionState:
+        i = self.random.randrange(len(self.states))
+        self.states[i], self.states[-1] = self.states[-1], self.states[i]
+        return self.states.pop()
+
+    def __len__(self):
+        return len(self.states)
+
+
+'''
+CoverageGuided
+prefers the most recent state about to run a line nobody has executed
+yet, falls back to depth-first order once everything pending is covered
+covered: set of executed line numbers, maintained by the parser
+'''
+
+
+class CoverageGuided(SearchStrategy):
+
+    def __init__(self, covered: set):
+        self.states = []
+        self.covered = covered
+
+    def add(self, states: list):
+        self.states.extend(reversed(states))
+
+    def pop(self) -> ExecutionState:
+        for i in range(len(self.states) - 1, -1, -1):
+            lineno = self.states[i].next_line()
+            if lineno is not None and lineno not in self.covered:
+                return self.states.pop(i)
+        return self.states.pop()
+
+    def __len__(self):
+        return len(self.states)
+
+
+STRATEGIES = ['dfs', 'bfs', 'random', 'coverage']
+
+
+'''
+GET_STRATEGY
+'''
+
+
+def get_strategy(name: str, covered: set, seed=None) -> SearchStrategy:
+    if name == 'dfs':
+        return DepthFirst()
+    if name == 'bfs':
+        return BreadthFirst()
+    if name == 'random':
+        return RandomPath(seed)
+    if name == 'coverage':
+        return CoverageGuided(covered)
+
+    raise ValueError(f"unknown search strategy: {name}")
@@ -0,0 +1,456 @@
+'''
+
+Incremental solver session used by the FunctionParser.
+
+A single Z3 Solver instance is kept alive for the whole exploration of a
+function. Scopes are pushed/popped alongside the branch structure of the
+parse, so constraints belonging to an abandoned branch are dropped from the
+solver while learned clauses from the shared prefix are kept.
+
+Every check is sliced into independent parts (KLEE's constraint
+independence): constraints are grouped into connected components by the
+variables they share, and each component is solved and cached on its own.
+A branch test only touching `x` re-solves the component of `x`, the
+constraints of unrelated locals are answered from the cache.
+
+A query holding a constraint which simplified to False is unsat without
+calling Z3.
+
+Queries the cache has not seen exactly are tried against earlier answers
+(a CounterexampleCache) before Z3 is called: most sibling branches are
+satisfied by an input that was already found.
+
+'''
+from collections import OrderedDict, deque
+from lazy import lazy_import
+
+z3 = lazy_import('z3')
+
+
+# z3's 'timeout' parameter value meaning no timeout (UINT_MAX)
+NO_TIMEOUT = 4294967295
+
+
+'''
+CANONICALIZE
+simplify a constraint and flatten top level conjunctions, returning the
+list of conjuncts. Z3 hash-conses terms, so equal conjuncts end up as the
+same AST and share an id.
+simplify: z3.simplify when None
+'''
+
+
+def canonicalize(expr, simplify=None) -> list:
+    simplify = simplify or z3.simplify
+    if isinstance(expr, bool):
+        expr = z3.BoolVal(expr)
+
+    expr = simplify(expr)
+    if z3.is_and(expr):
+        return [conjunct for child in expr.children()
+                for conjunct in canonicalize(child, simplify)]
+    if z3.is_true(expr):
+        return []
+    return [expr]
+
+
+'''
+CounterexampleCache
+
+earlier answers, keyed like the QueryCache (sets of conjunct ids):
+- a query containing every conjunct of an unsat set is unsat
+- a query made of conjuncts of a sat set is satisfied by that set's model
+- a query a stored model evaluates to True on is satisfied by that model
+Models are tried most recent first and without model completion, so a
+model only matches if it assigns every variable of the query.
+'''
+
+
+class CounterexampleCache():
+
+    def __init__(self, max_models: int = 64, max_unsat: int = 256):
+        self.models = deque(maxlen=max_models)  # (key, model)
+        self.unsat = deque(maxlen=max_unsat)  # keys
+        self.hits = 0
+
+    '''
+    GET - (result, model) or None
+    '''
+
+    def get(self, key: frozenset, conjuncts: list):
+        for unsat_key in self.unsat:
+            if unsat_key <= key:
+                self.hits += 1
+                return z3.unsat, None
+
+        for sat_key, model in reversed(self.models):
+            if key <= sat_key:
+                self.hits += 1
+                return z3.sat, model
+
+        formula = z3.And(conjuncts)
+        for sat_key, model in reversed(self.models):
+            if z3.is_true(model.eval(formula)):
+                self.hits += 1
+                return z3.sat, model
+
+        return None
+
+    '''
+    PUT
+    '''
+
+    def put(self, key: frozenset, result, model):
+        if result == z3.sat:
+            self.models.append((key, model))
+        elif result == z3.unsat:
+            self.unsat.append(key)
+
+
+'''
+GET_VARIABLES - ids of the uninterpreted constants (variables) in exprs
+'''
+
+
+def get_variables(exprs: list) -> set:
+    variables = set()
+    seen = set()
+    stack = list(exprs)
+    while stack:
+        expr = stack.pop()
+        expr_id = expr.get_id()
+        if expr_id in seen:
+            continue
+        seen.add(expr_id)
+
+        if z3.is_const(expr) \
+                and expr.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            variables.add(expr_id)
+        else:
+            stack.extend(expr.children())
+    return variables
+
+
+'''
+PARTITION
+group guard entries into the connected components of the "shares a
+variable" relation, in order of first appearance.
+Returns a (variables, entries) pair per component.
+'''
+
+
+def partition(entries: list) -> list:
+    components = []  # [variables, entries], None once merged into another
+    owner = {}  # variable -> index of its component
+    for entry in entries:
+        indexes = sorted({owner[var] for var in entry[3] if var in owner})
+        if not indexes:
+            index = len(components)
+            components.append([set(), []])
+        else:
+            # merge into the earliest component
+            index = indexes[0]
+            for other in indexes[1:]:
+                variables, merged = components[other]
+                components[index][0] |= variables
+                components[index][1].extend(merged)
+                components[other] = None
+                for var in variables:
+                    owner[var] = index
+
+        components[index][0] |= entry[3]
+        components[index][1].append(entry)
+        for var in entry[3]:
+            owner[var] = index
+
+    return [(variables, merged) for variables, merged in
+            filter(None, components)]
+
+
+'''
+MergedModel
+
+model of a sliced query: the union of the models of its components, which
+share no variables. The solver holds the constraints of every path, so a
+component's model also assigns arbitrary values to variables outside of it;
+each variable is only read from the model of its own component.
+Indexed like a z3 ModelRef, a variable no component constrains maps to None.
+
+models: (variables, model) per component
+'''
+
+
+class MergedModel():
+
+    def __init__(self, models: list):
+        self.models = models
+
+    def __getitem__(self, var):
+        var_id = var.get_id()
+        for variables, model in self.models:
+            if var_id in variables:
+                return model[var]
+        return None
+
+    def __repr__(self):
+        return repr(self.models)
+
+
+'''
+QueryCache
+
+LRU memo of solver answers keyed by the canonical conjunction of a query:
+the set of ids of its conjuncts, so ordering and duplicates do not matter.
+'''
+
+
+class QueryCache():
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    KEY
+    '''
+
+    @staticmethod
+    def key(conjuncts: list) -> frozenset:
+        return frozenset(conjunct.get_id() for conjunct in conjuncts)
+
+    '''
+    GET - (result, model) or None
+    '''
+
+    def get(self, key: frozenset):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        result, model, conjuncts = self.entries[key]
+        return result, model
+
+    '''
+    PUT
+    conjuncts are kept alive with the entry, an AST id is only unique while
+    the AST exists
+    '''
+
+    def put(self, key: frozenset, result, model, conjuncts: list):
+        self.entries[key] = (result, model, conjuncts)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+'''
+SolverSession
+
+Constraints are asserted lazily, the first time a check sees them, as
+Implies(guard, constraint) under a fresh guard literal. A check only
+assumes the guards of the constraints which are active on the current
+path, which lets a variable re-assignment replace its old constraint
+without tearing down the solver.
+
+Before the solver is called the query is looked up in a QueryCache, sibling
+branches re-checking the same prefix never reach Z3 twice.
+
+rlimit: Z3 resource limit for the whole session (deterministic, unlike
+        wall-clock timeouts), None for unlimited
+'''
+
+
+class SolverSession():
+
+    def __init__(self, cache_size: int = 1024, rlimit: int = None):
+        self.solver = z3.Solver()
+        self.cache = QueryCache(cache_size)
+        self.counterexamples = CounterexampleCache()
+        self.last_model = None
+        self.timeout = NO_TIMEOUT
+
+        if rlimit is not None:
+            self.solver.set('rlimit', rlimit)
+
+        # one entry per solver scope:
+        # id(constraint) -> (constraint, guard, conjuncts, variables)
+        self.guards: list = [{}]
+        self.slices = 0
+        self.trivial = 0
+        self.checks = 0  # Solver.check invocations
+
+        # ast id -> (expr, simplified expr)
+        self.simplified = {}
+
+    '''
+    STATS
+    '''
+
+    @property
+    def stats(self) -> dict:
+        return {'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses,
+                'slices': self.slices,
+                'reused': self.counterexamples.hits,
+                'trivial': self.trivial,
+                'z3_checks': self.checks}
+
+    '''
+    PUSH - open a new solver scope (entering a branch)
+    '''
+
+    def push(self):
+        self.solver.push()
+        self.guards.append({})
+
+    '''
+    POP - discard the innermost solver scope (leaving a branch)
+    '''
+
+    def pop(self):
+        self.solver.pop()
+        self.guards.pop()
+
+    '''
+    SYNC
+    match the solver scopes to the branch depth of the state about to run,
+    scopes of branches that are no longer active are dropped
+    '''
+
+    def sync(self, depth: int):
+        while len(self.guards) - 1 > depth:
+            self.pop()
+        while len(self.guards) - 1 < depth:
+            self.push()
+
+    '''
+    GET GUARD
+    returns (constraint, guard, conjuncts, variables) for a constraint, asserting it in
+    the current scope if it has not been seen by any open scope yet.
+    Constraints may be lazy (callables), they are only expanded once.
+    '''
+
+    def get_guard(self, constraint):
+        key = id(constraint)
+        for scope in reversed(self.guards):
+            if key in scope:
+                return scope[key]
+
+        expr = constraint() if hasattr(constraint, '__call__') else constraint
+        if expr is None:
+            return None
+
+        guard = z3.FreshBool('guard')
+        self.solver.add(z3.Implies(guard, expr))
+
+        # keep a reference to the constraint so its id cannot be re-used
+        conjuncts = canonicalize(expr, self.simplify)
+        entry = (constraint, guard, conjuncts, get_variables(conjuncts))
+        self.guards[-1][key] = entry
+        return entry
+
+    '''
+    SIMPLIFY
+    z3.simplify, once per distinct term: Z3 hash-conses terms, so repeated
+    subterms share an id. The original expr is kept alive with its entry.
+    '''
+
+    def simplify(self, expr):
+        key = expr.get_id()
+        entry = self.simplified.get(key)
+        if entry is None:
+            entry = self.simplified[key] = (expr, z3.simplify(expr))
+        return entry[1]
+
+    '''
+    SET TIMEOUT - seconds, None for no timeout
+    '''
+
+    def set_timeout(self, timeout: float = None):
+        timeout = NO_TIMEOUT if timeout is None else max(1, int(timeout * 1000))
+        if timeout != self.timeout:
+            self.solver.set('timeout', timeout)
+            self.timeout = timeout
+
+    '''
+    CHECK
+    constraints: iterable of the constraints active on the path
+    timeout: seconds this query may take, an exceeded timeout or resource
+             limit answers z3.unknown
+    '''
+
+    def check(self, constraints, timeout: float = None):
+        entries = [entry for entry in map(self.get_guard, constraints)
+                   if entry is not None and entry[2]]
+
+        if any(z3.is_false(conjunct)
+               for entry in entries for conjunct in entry[2]):
+            self.trivial += 1
+            self.last_model = None
+            return z3.unsat
+
+        # sat only if every independent component is, an unsat component
+        # decides the query even when another one is unknown
+        result = z3.sat
+        models = []
+        for variables, component in partition(entries):
+            answer, model = self.check_component(component, timeout)
+            if answer == z3.unsat:
+                result = z3.unsat
+                break
+            if answer == z3.unknown:
+                result = z3.unknown
+            else:
+                models.append((variables, model))
+
+        self.last_model = MergedModel(models) if result == z3.sat else None
+        return result
+
+    '''
+    CHECK_COMPONENT
+    solve one independent component under the guards of its constraints,
+    returns (result, model)
+    '''
+
+    def check_component(self, entries: list, timeout: float = None):
+        conjuncts = [conjunct for entry in entries for conjunct in entry[2]]
+
+        key = QueryCache.key(conjuncts)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        reused = self.counterexamples.get(key, conjuncts)
+        if reused is not None:
+            self.cache.put(key, *reused, conjuncts)
+            return reused
+
+        self.slices += 1
+        self.set_timeout(timeout)
+        self.checks += 1
+        result = self.solver.check(*[entry[1] for entry in entries])
+        model = self.solver.model() if result == z3.sat else None
+
+        # 'unknown' may resolve differently next time, never memoize it
+        if result != z3.unknown:
+            self.cache.put(key, result, model, conjuncts)
+            self.counterexamples.put(key, result, model)
+        return result, model
+
+    '''
+    REASON UNKNOWN - why the last check answered unknown
+    '''
+
+    def reason_unknown(self) -> str:
+        return self.solver.reason_unknown()
+
+    '''
+    MODEL - model of the last satisfiable check
+    '''
+
+    def model(self):
+        return self.last_model
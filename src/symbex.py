@@ -3,11 +3,34 @@
 
 import ast
 import json
-from typing import Set, List
-from ast2json import ast2json
-import z3tools
-import z3
-import copy
+import os
+import time
+# concurrent.futures only imports ProcessPoolExecutor (and multiprocessing)
+# once a pool is started
+import concurrent.futures
+from functools import partial
+from typing import Set, List, Iterator
+from lazy import lazy_import
+from solver import SolverSession
+from constraints import PathCondition
+from search import ExecutionState, get_strategy
+from cfg import UNBOUND, get_cfg
+from metrics import FunctionMetrics
+from tracer import Tracer, TracerGroup
+
+# z3 (and z3tools, which star imports it) load on first use, the CLI does
+# not pay for them when every function comes from the cache
+z3 = lazy_import('z3')
+z3tools = lazy_import('z3tools')
+
+
+# bumped whenever a change to the engine can change analysis results,
+# invalidates persisted results (see cache.py)
+ENGINE_VERSION = '0.14'
+
+# iterations a for loop which cannot be summarized is unrolled when no
+# --unroll bound was given
+DEFAULT_UNROLL = 4
 
 '''
 AST GUIDE:
@@ -100,6 +123,18 @@ expr = BoolOp(boolop op, expr* values)
 '''
 
 
+'''
+AST2JSON
+the ast2json package is only imported by the first conversion, most runs
+never print the AST
+'''
+
+
+def ast2json(node: ast.AST) -> dict:
+    from ast2json import ast2json as convert
+    return convert(node)
+
+
 '''
 GET_EXPR
 basic 'unwrap' function only if expression is a function
@@ -110,24 +145,185 @@ def get_expr(expr):
     return expr() if hasattr(expr,  '__call__') else expr
 
 
+'''
+GET_FUNCTIONS
+top-level function definitions of a module, the unit of analysis
+'''
+
+
+def get_functions(ast_tree: ast.Module) -> list:
+    # Current Implementation Only interested in pure function analysis
+    return [body for body in ast_tree.body
+            if isinstance(body, ast.FunctionDef)]
+
+
+'''
+ANALYZE_FUNCTION
+process pool entry point: explore a single function in the worker's own
+Z3 context and hand back a picklable FunctionResult
+options: FunctionParser keyword arguments
+tracer: optional Tracer, only meaningful when run in-process
+'''
+
+
+def analyze_function(body: ast.FunctionDef, options: dict = None,
+                     tracer: Tracer = None):
+    parse_func: FunctionParser = FunctionParser(body.name, body,
+                                                **(options or {}))
+    if tracer is not None:
+        parse_func.add_tracer(tracer)
+    parse_func.parse()
+    return parse_func.result()
+
+
+'''
+PARSE_FUNCTIONS
+shared by FileParser/ModuleParser. With jobs > 1 the functions are fanned
+out to a process pool (jobs=0 uses every core), results come back in
+source order as FunctionResults instead of live FunctionParsers.
+options: FunctionParser keyword arguments, also part of the cache key
+tracer: Tracer registered on every explored function, functions are then
+        explored in this process whatever jobs is
+'''
+
+
+def parse_functions(ast_tree: ast.Module, jobs: int = 1, cache=None,
+                    options: dict = None, tracer: Tracer = None) -> list:
+    options = options or {}
+    functions = get_functions(ast_tree)
+    parsed = [None] * len(functions)
+
+    # functions unchanged since a previous run come straight from the cache
+    todo = []
+    for i, body in enumerate(functions):
+        if cache is not None:
+            parsed[i] = cache.get(body, options)
+        if parsed[i] is None:
+            todo.append(i)
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if tracer is not None:
+        jobs = 1
+
+    if jobs <= 1 or len(todo) <= 1:
+        for i in todo:
+            body = functions[i]
+            # get function anme from AST
+            func_name = body.name
+
+            parse_func: FunctionParser = FunctionParser(func_name, body,
+                                                        **options)
+            if tracer is not None:
+                parse_func.add_tracer(tracer)
+            parse_func.parse()
+            parsed[i] = parse_func
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(jobs, len(todo))) as pool:
+            results = pool.map(partial(analyze_function, options=options),
+                               [functions[i] for i in todo])
+            for i, result in zip(todo, results):
+                parsed[i] = result
+
+    if cache is not None:
+        for i in todo:
+            result = parsed[i]
+            if isinstance(result, FunctionParser):
+                result = result.result()
+            cache.put(functions[i], result, options)
+
+    return parsed
+
+
+'''
+ITER_FUNCTIONS
+like parse_functions, but yields a FunctionResult per function as soon as
+it is available (cached ones first, then in completion order) and keeps
+none of them
+'''
+
+
+def iter_functions(ast_tree: ast.Module, jobs: int = 1, cache=None,
+                   options: dict = None,
+                   tracer: Tracer = None) -> Iterator['FunctionResult']:
+    options = options or {}
+
+    todo = []
+    for body in get_functions(ast_tree):
+        result = cache.get(body, options) if cache is not None else None
+        if result is None:
+            todo.append(body)
+        else:
+            yield result
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if tracer is not None:
+        jobs = 1
+
+    if jobs <= 1 or len(todo) <= 1:
+        for body in todo:
+            result = analyze_function(body, options, tracer)
+            if cache is not None:
+                cache.put(body, result, options)
+            yield result
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(todo))) as pool:
+        futures = {pool.submit(analyze_function, body, options): body
+                   for body in todo}
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if cache is not None:
+                cache.put(futures[future], result, options)
+            yield result
+
+
 """
 Root Parser, which iterates over a provided python source file,
 then break down and parsed functions
 
+jobs: number of worker processes used to analyze functions (0 = all cores)
+cache: optional AnalysisCache, functions found in it are not re-explored
+options: FunctionParser keyword arguments (analysis modes and limits)
+tracer: optional Tracer (tracer.py) hooked into every explored function,
+        which are then explored in this process
+
 """
 
 
 class FileParser():
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, jobs: int = 1, cache=None,
+                 options: dict = None, tracer: Tracer = None):
         try:
+            start = time.perf_counter()
             self.ast_tree = ast.parse(open(filename).read())
-            self.json_tree = ast2json(self.ast_tree)
+            self.timings = {'parse': time.perf_counter() - start, 'json': 0.0}
+            self._json_tree = None
             self.functions: list = []
+            self.jobs = jobs
+            self.cache = cache
+            self.options = options or {}
+            self.tracer = tracer
         except Exception as ex:
             print(ex)
             exit(1)
 
+    '''
+    JSON TREE - ast2json conversion, only built when first requested
+    '''
+
+    @property
+    def json_tree(self):
+        if self._json_tree is None:
+            start = time.perf_counter()
+            self._json_tree = ast2json(self.ast_tree)
+            self.timings['json'] += time.perf_counter() - start
+        return self._json_tree
+
     '''
     PRINT RESULTS
     '''
@@ -148,19 +344,9 @@ class FileParser():
     '''
 
     def parse(self):
-
-        for body in self.json_tree['body']:
-
-            # Current Implementation Only interested in pure function analysis
-            if body["_type"] != "FunctionDef":
-                continue
-
-            # get function anme from AST
-            func_name = body['name']
-
-            parse_func: FunctionParser = FunctionParser(func_name, body)
-            parse_func.parse()
-            self.functions.append(parse_func)
+        self.functions.extend(parse_functions(self.ast_tree, self.jobs,
+                                              self.cache, self.options,
+                                              self.tracer))
 
 
 """
@@ -173,15 +359,34 @@ of full python module/source file.
 
 class ModuleParser():
 
-    def __init__(self, payload: str):
+    def __init__(self, payload: str, jobs: int = 1, cache=None,
+                 options: dict = None, tracer: Tracer = None):
         try:
+            start = time.perf_counter()
             self.ast_tree = ast.parse(payload)
-            self.json_tree = ast2json(self.ast_tree)
+            self.timings = {'parse': time.perf_counter() - start, 'json': 0.0}
+            self._json_tree = None
             self.functions: list = []
+            self.jobs = jobs
+            self.cache = cache
+            self.options = options or {}
+            self.tracer = tracer
         except Exception as ex:
             print(ex)
             exit(1)
 
+    '''
+    JSON TREE - ast2json conversion, only built when first requested
+    '''
+
+    @property
+    def json_tree(self):
+        if self._json_tree is None:
+            start = time.perf_counter()
+            self._json_tree = ast2json(self.ast_tree)
+            self.timings['json'] += time.perf_counter() - start
+        return self._json_tree
+
     '''
     PRINT RESULTS
     '''
@@ -198,29 +403,47 @@ class ModuleParser():
 
     '''
     GET AST as string
+    indent: None for compact JSON
+    functions: only include the top-level functions with these names
+    lines: only include top-level statements overlapping one of these
+           (first, last) line ranges
     '''
 
-    def get_ast(self):
-        return json.dumps(self.json_tree, indent=4)
+    def get_ast(self, indent: int = 4, functions: list = None,
+                lines: list = None):
+        separators = (',', ':') if indent is None else None
+
+        if functions is None and lines is None:
+            return json.dumps(self.json_tree, indent=indent,
+                              separators=separators)
+
+        body = [node for node in self.ast_tree.body
+                if (functions is None or getattr(node, 'name', None) in functions)
+                and (lines is None or any(node.lineno <= last
+                                          and first <= node.end_lineno
+                                          for first, last in lines))]
+        tree = ast.Module(body=body, type_ignores=self.ast_tree.type_ignores)
+        start = time.perf_counter()
+        json_tree = ast2json(tree)
+        self.timings['json'] += time.perf_counter() - start
+        return json.dumps(json_tree, indent=indent, separators=separators)
 
     '''
     PARSE
     '''
 
     def parse(self):
+        self.functions.extend(parse_functions(self.ast_tree, self.jobs,
+                                              self.cache, self.options,
+                                              self.tracer))
 
-        for body in self.json_tree['body']:
-
-            # Current Implementation Only interested in pure function analysis
-            if body["_type"] != "FunctionDef":
-                continue
-
-            # get function anme from AST
-            func_name = body['name']
+    '''
+    ITER PARSE - FunctionResults as functions finish, they are not kept
+    '''
 
-            parse_func: FunctionParser = FunctionParser(func_name, body)
-            parse_func.parse()
-            self.functions.append(parse_func)
+    def iter_parse(self) -> Iterator['FunctionResult']:
+        return iter_functions(self.ast_tree, self.jobs, self.cache,
+                              self.options, self.tracer)
 
 
 '''
@@ -243,6 +466,48 @@ class CEViolation():
         return f"Unsatisfied: - line {self.lineno} ({get_expr(self.expr)})"
 
 
+'''
+Undecided
+
+branch the solver could not decide (timeout/resource limit), neither a
+test case nor proof of unreachable code
+'''
+
+
+class Undecided(CEViolation):
+
+    def __init__(self, expr, lineno, reason: str):
+        super().__init__(expr, lineno)
+        self.reason = reason
+
+    def print(self):
+        print(self.get_err())
+
+    def get_err(self):
+        return f"Undecided ({self.reason}): - line {self.lineno} ({get_expr(self.expr)})"
+
+
+'''
+LoopBound
+
+path which could still run another iteration when the unrolling bound
+was reached
+'''
+
+
+class LoopBound(CEViolation):
+
+    def __init__(self, expr, lineno, bound: int):
+        super().__init__(expr, lineno)
+        self.bound = bound
+
+    def print(self):
+        print(self.get_err())
+
+    def get_err(self):
+        return f"Loop bound reached ({self.bound} iterations): - line {self.lineno} ({get_expr(self.expr)})"
+
+
 '''
 
 TestCase
@@ -276,46 +541,42 @@ class TestCase():
         return str(self.test_vars)
 
 
-''''
-Function Parser
-
-
 '''
 
+FunctionResult
 
-class FunctionParser():
-
-    def __init__(self, func_name: str, body: dict):
-        '''
-            basic constructor for new FunctionParser instances
-
-        name: name of function
-        body:  main body source code of the function
-        tests:  concrete inputs accumlated to trigger various branches/paths
-        constraints: active constraint set of the ongoing parse/search
-        expressions: list of collected expressions through search
-        errors: list of triggered unsatisfiable conditional arguments for code branching
-
-        '''
-
-        self.name = func_name
-        self.body = body['body']
+Picklable snapshot of a finished FunctionParser, the form in which results
+travel back from worker processes. Prints exactly like the FunctionParser
+it was taken from.
+'''
 
-        self.tests = []
-        self.constraints = {}
-        self.expressions = []
-        self.errors = []
 
-        self.skip_lines = []  # track lines which do not need to be re-parsed by the engine
+class FunctionResult():
+
+    def __init__(self, name: str, args: list, vars: list, tests: list,
+                 errors: list, stats: dict, complete: bool = True,
+                 cutoff: str = None, undecided: list = None,
+                 bounded: list = None, metrics: FunctionMetrics = None):
+        self.name = name
+        self.args = args
+        self.vars = vars
+        self.tests = tests
+        self.errors = errors
+        self.undecided = undecided or []
+        self.bounded = bounded or []
+        self.stats = stats
+        self.metrics = metrics or FunctionMetrics()
+        self.complete = complete
+        self.cutoff = cutoff
+        self.cached = False
 
-        args = body['args']['args']
-        # function args
-        self.args = {arg['arg']:
-                     z3tools.get_z3_var(arg['arg'], arg['annotation']['id'])
-                     for arg in args}
+    '''
+    FORMAT VARS - same rendering as a {name: z3 var} dict
+    '''
 
-        # local vars and function args
-        self.vars = copy.deepcopy(self.args)
+    @staticmethod
+    def format_vars(names: list) -> str:
+        return '{' + ', '.join(f"'{name}': {name}" for name in names) + '}'
 
     '''
     DEBUG PRINTER
@@ -323,35 +584,89 @@ class FunctionParser():
 
     def debug(self):
         print(f"function: {self.name}")
-        print(f"args: {self.args}")
-        print(f"vars: {self.vars}")
+        print(f"args: {self.format_vars(self.args)}")
+        print(f"vars: {self.format_vars(self.vars)}")
         print()
 
-        # print(f"branch expressions: ")
-        # for expr in self.expressions:
-        #     for k, v in expr.items():
-        #         print(get_expr(v))
-
-        # print(f"constraints:")
-        # for k, expr in self.constraints.items():
-        #     print(get_expr(expr))
-
-        # print(f"tests: {self.tests}")
-
         print(f"Test Cases: ")
-        distinct_cases = set([test.get_printline() for test in self.tests])
-        for test in distinct_cases:
+        for test in self.tests:
             print(test)
         print()
         print(f"Errors/Issues: ")
         for err in self.errors:
             err.print()
         print()
+        if self.undecided:
+            print(f"Undecided: ")
+            for err in self.undecided:
+                err.print()
+            print()
+        if self.bounded:
+            print(f"Loop Bounds: ")
+            for err in self.bounded:
+                err.print()
+            print()
+        if not self.complete:
+            print(f"Exploration cut off: {self.cutoff} budget exhausted")
+            print()
+        print(f"Work: {self.stats['solver_calls']} solver calls "
+              f"({self.stats['z3_checks']} Z3 checks, "
+              f"{self.metrics.solver_time:.3f}s), {self.stats['paths']} paths, "
+              f"{self.metrics.forks} forks, {self.stats['time']:.3f}s")
+        print()
         print()
 
-        # self.print_ast()
-        # print(f"body: {self.body}")
-        # print(f"expr: {self.expr}")
+    '''
+    TO DICT - JSON friendly record
+    base_lineno: subtracted from line numbers, to store them relative
+    '''
+
+    def to_dict(self, base_lineno: int = 0) -> dict:
+        return {
+            'function': self.name,
+            'args': self.args,
+            'vars': self.vars,
+            'tests': self.tests,
+            'errors': [{'lineno': err.lineno - base_lineno,
+                        'constraints': get_expr(err.expr)}
+                       for err in self.errors],
+            'undecided': [{'lineno': err.lineno - base_lineno,
+                           'constraints': get_expr(err.expr),
+                           'reason': err.reason}
+                          for err in self.undecided],
+            'bounded': [{'lineno': err.lineno - base_lineno,
+                         'constraints': get_expr(err.expr),
+                         'bound': err.bound}
+                        for err in self.bounded],
+            'stats': self.stats,
+            'metrics': self.metrics.to_dict(base_lineno),
+            'complete': self.complete,
+            'cutoff': self.cutoff,
+            'cached': self.cached,
+        }
+
+    '''
+    FROM DICT - inverse of to_dict
+    '''
+
+    @staticmethod
+    def from_dict(record: dict, base_lineno: int = 0):
+        errors = [CEViolation(err['constraints'], err['lineno'] + base_lineno)
+                  for err in record['errors']]
+        undecided = [Undecided(err['constraints'], err['lineno'] + base_lineno,
+                               err['reason'])
+                     for err in record.get('undecided', [])]
+        bounded = [LoopBound(err['constraints'], err['lineno'] + base_lineno,
+                             err['bound'])
+                   for err in record.get('bounded', [])]
+        result = FunctionResult(record['function'], record['args'],
+                                record['vars'], record['tests'], errors,
+                                record['stats'], record.get('complete', True),
+                                record.get('cutoff'), undecided, bounded,
+                                FunctionMetrics.from_dict(record.get('metrics'),
+                                                          base_lineno))
+        result.cached = record.get('cached', False)
+        return result
 
     '''
     RESULT STRING
@@ -361,150 +676,480 @@ class FunctionParser():
         s: str = ""
         s += f"\n"
         s += f"\nfunction: {self.name}"
-        s += f"\nargs: {self.args}"
+        s += f"\nargs: {self.format_vars(self.args)}"
         s += f"\n"
         s += f"\nTest Cases: "
         s += f"\n"
 
-        distinct_cases = set([test.get_printline() for test in self.tests])
-        for test in distinct_cases:
+        for test in self.tests:
             s += "\n"+str(test)
         s += "\n"
         s += f"\nErrors/Issues: "
 
         for err in self.errors:
             s += f"\n{err.get_err()}"
+
+        if self.undecided:
+            s += "\n"
+            s += f"\nUndecided: "
+            for err in self.undecided:
+                s += f"\n{err.get_err()}"
+
+        if self.bounded:
+            s += "\n"
+            s += f"\nLoop Bounds: "
+            for err in self.bounded:
+                s += f"\n{err.get_err()}"
+
+        if not self.complete:
+            s += "\n"
+            s += f"\nExploration cut off: {self.cutoff} budget exhausted"
         return s
 
+
+''''
+Function Parser
+
+
+'''
+
+
+class FunctionParser():
+
+    def __init__(self, func_name: str, body: ast.FunctionDef,
+                 merge: bool = False, strategy: str = 'dfs',
+                 max_paths: int = None, max_depth: int = None,
+                 time_budget: float = None, seed: int = None,
+                 query_timeout: float = None, rlimit: int = None,
+                 unroll: int = None):
+        '''
+            basic constructor for new FunctionParser instances
+
+        name: name of function
+        body:  main body source code of the function
+        tests:  concrete inputs accumlated to trigger various branches/paths
+        constraints: active constraint set of the ongoing parse/search
+        expressions: list of collected expressions through search
+        errors: list of triggered unsatisfiable conditional arguments for code branching
+        dead/reached: (line, side) of branches found unsatisfiable on some
+               path / satisfiable on some path. A branch goes into errors
+               (once) at the end of parse only when no path reached it.
+        session: incremental solver shared by every check of this function
+        stats: work counters reported alongside the results
+        metrics: per line solver/fork counters and timers (metrics.py)
+        tracer: hooks told about lines, branches, solver queries, paths and
+               violations (tracer.py), None while none is registered
+        merge: join assignment-only if/else branches into If(...) guarded
+               constraints instead of exploring and checking each side
+        strategy: order pending branches are explored in (search.STRATEGIES)
+        max_paths, max_depth, time_budget: exploration budgets (paths
+               finished, branch nesting, seconds), None for unbounded
+        seed: random seed of the 'random' strategy
+        query_timeout: seconds a single solver query may take, the
+               remaining time_budget also bounds every query
+        rlimit: Z3 resource limit for the function's solver
+        undecided: branches the solver gave up on (timeout/rlimit)
+        unroll: unroll While loops up to this many iterations instead of
+               walking the body once, paths still looping at the bound are
+               collected in bounded. For loops over range() are summarized
+               in closed form, the ones that cannot be are unrolled up to
+               this bound (DEFAULT_UNROLL if None)
+        cfg: the function lowered to basic blocks (cfg.py), shared through
+               the CFG cache by every parser of the same function
+        vars: Z3 constant bound to each variable on the running path, by
+               slot of the cfg (cfg.UNBOUND when not bound), every
+               assignment binds a fresh version (SSA)
+        concrete: concrete value of each version assigned a constant, such
+               versions are substituted and their uses constant folded
+        complete/cutoff: whether exploration finished, else which budget
+               stopped it
+
+        '''
+
+        self.name = func_name
+        self.body = body.body
+
+        self.tests = []
+        self.constraints = PathCondition()
+        self.expressions = []
+        self.errors = []
+        self.dead = {}
+        self.reached = set()
+        self.undecided = []
+        self.bounded = []
+        self.unroll = unroll
+        self.pruned = False  # set when the running state turned out infeasible
+        self.session = SolverSession(rlimit=rlimit)
+        self.query_timeout = query_timeout
+        self.stats = {'solver_calls': 0, 'cached_queries': 0, 'sat': 0,
+                      'unsat': 0, 'unknown': 0, 'merged': 0, 'summarized': 0,
+                      'decided': 0, 'paths': 0, 'time': 0.0}
+        self.metrics = FunctionMetrics()
+        self.tracer = None
+        self.merge = merge
+
+        self.covered = set()  # line numbers executed on any path
+        self.strategy = get_strategy(strategy, self.covered, seed)
+        self.max_paths = max_paths
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.complete = True
+        self.cutoff = None
+        self.forked = None  # states spawned by the op being run
+        self.running = None  # state being run
+        self.target = None  # block a loop op continues the running state in
+
+        self.walked = set()  # loops whose body was walked once already
+
+        self.cfg = get_cfg(body, unroll is not None)
+        self.names = self.cfg.names
+        self.handlers = {
+            'noop': self.handle_noop,
+            'error': self.handle_error,
+            'var': self.handle_var,
+            'assign': self.handle_var_change,
+            'branch': self.handle_branching,
+            'while': self.handle_while_loop,
+            'for': self.handle_for_loop,
+            'check': self.handle_check,
+            'loop_entry': self.handle_loop_entry,
+            'latch': self.handle_latch,
+            'walked': self.handle_walked,
+        }
+
+        args = body.args.args
+        # function args
+        self.args = {arg.arg:
+                     z3tools.get_z3_var(arg.arg, arg.annotation.id)
+                     for arg in args}
+
+        # local vars and function args, args take the first slots
+        self.vars = list(self.args.values())
+        self.vars.extend([UNBOUND] * (len(self.names) - len(self.vars)))
+
+        # every variable ever bound, and how many versions of it exist
+        self.declared = dict.fromkeys(self.args)
+        self.versions = dict.fromkeys(self.args, 0)
+        self.concrete = {}
+
+    '''
+    RESULT - picklable snapshot of the exploration
+    '''
+
+    def result(self) -> FunctionResult:
+        distinct_cases = {}
+        for test in self.tests:
+            distinct_cases.setdefault(test.get_printline(), test.test_vars)
+        errors = [CEViolation(str(get_expr(err.expr)), err.lineno)
+                  for err in self.errors]
+        undecided = [Undecided(str(get_expr(err.expr)), err.lineno, err.reason)
+                     for err in self.undecided]
+        bounded = [LoopBound(str(get_expr(err.expr)), err.lineno, err.bound)
+                   for err in self.bounded]
+
+        stats = dict(self.stats)
+        stats.update(self.session.stats)
+
+        return FunctionResult(self.name, list(self.args), list(self.declared),
+                              list(distinct_cases.values()), errors, stats,
+                              self.complete, self.cutoff, undecided, bounded,
+                              self.metrics)
+
+    '''
+    ADD_TRACER - register a Tracer, several are called in order
+    '''
+
+    def add_tracer(self, tracer: Tracer):
+        if self.tracer is None:
+            self.tracer = tracer
+        elif isinstance(self.tracer, TracerGroup):
+            self.tracer.add(tracer)
+        else:
+            self.tracer = TracerGroup([self.tracer, tracer])
+
+    '''
+    DEBUG PRINTER
+    '''
+
+    def debug(self):
+        self.result().debug()
+
+    '''
+    RESULT STRING
+    '''
+
+    def result_string(self):
+        return self.result().result_string()
+
     '''
     PRINT AST
     '''
 
     def print_ast(self):
-        print(json.dumps(self.body, indent=4))
+        print(json.dumps([ast2json(line) for line in self.body], indent=4))
 
     '''
     PARSE - base call/initiate parsing of function
     '''
 
     def parse(self):
+        start = self.start = time.perf_counter()
+
         # begin traversing function body
-        for line in self.body:
-            self.parse_body_line(line)
+        self.strategy.add([ExecutionState(self.cfg.entry, 0, self.constraints,
+                                          self.vars)])
+
+        while len(self.strategy) > 0:
+            cutoff = self.check_budgets(start)
+            if cutoff:
+                self.cut_off(cutoff)
+                break
+            self.run_state(self.strategy.pop())
+
+        self.report_dead()
+        self.stats['time'] += time.perf_counter() - start
 
     '''
-    PARSE_BODY_LINE
-     basic line handling for symbolic execution
+    RUN_STATE
+    executes a state's ops until it finishes (one more path) or an op forks
+    it, then the new states and the continuation of this one go back to the
+    search strategy
     '''
 
-    def parse_body_line(self, line, depth=0):
+    def run_state(self, state: ExecutionState):
+        self.running = state
+        self.constraints = state.constraints
+        self.vars = state.vars
+        self.session.sync(state.depth)
+
+        block, pc = state.block, state.pc
+        while pc < len(block.ops):
+            op = block.ops[pc]
+            pc += 1
+            if op.stmt:
+                self.covered.add(op.lineno)
+            self.exec_op(op, state.depth)
+
+            # loop ops continue the path in the loop's exit block
+            if self.target is not None:
+                block, pc = self.target, 0
+                self.target = None
+
+            forked, self.forked = self.forked, None
+            if self.pruned:
+                self.pruned = False
+                if forked:
+                    self.strategy.add(forked)
+                return
+
+            if forked is not None:
+                state.block, state.pc = block, pc
+                state.constraints = self.constraints
+                state.vars = self.vars
+                self.strategy.add(forked + [state])
+                return
+
+        self.stats['paths'] += 1
+        if self.tracer is not None:
+            self.tracer.on_path_complete(self, state)
 
-        # special case where code has already been parsed
-        if self.detect_line_skip(line):
-            return
+    '''
+    EXEC_OP - run one op of the CFG
+    '''
 
-        # handle a variable being defined/assigned for first time.
-        elif self.detect_var(line):
-            self.handle_var(line)
+    def exec_op(self, op, depth=0):
+        if op.stmt and self.tracer is not None:
+            self.tracer.on_line(self, op.line, depth)
+        self.handlers[op.kind](op, depth)
+
+    '''
+    FORK - queue new states, picked up by run_state after the op
+    '''
 
-        elif self.detect_var_change(line):
-            self.handle_var_change(line)
+    def fork(self, states: list, line: ast.stmt):
+        self.metrics.record_fork(line.lineno, len(states))
+        self.forked = states
 
-        elif self.detect_branching(line):  # detect branching (If statements)
-            self.handle_branching(line, depth)
+    '''
+    NEW_STATE - state forked from the running one, with its own bindings
+    loops: iteration counters, shared with the running state unless given
+    '''
 
-        elif self.detect_while_loop(line):
-            self.handle_while_loop(line)
+    def new_state(self, block, depth: int, loops: dict = None) -> ExecutionState:
+        if loops is None:
+            loops = self.running.loops
+        return ExecutionState(block, 0, self.constraints, list(self.vars),
+                              depth, loops)
 
     '''
-    CHECK_SATISFIABILITY
+    CHECK_BUDGETS - name of the first exhausted budget, if any
+    '''
 
+    def check_budgets(self, start: float):
+        if self.max_paths is not None and self.stats['paths'] >= self.max_paths:
+            return 'paths'
+        if self.time_budget is not None \
+                and time.perf_counter() - start > self.time_budget:
+            return 'time'
+        return None
 
     '''
+    GET_QUERY_TIMEOUT
+    per-query timeout, capped by what is left of the function's time budget
+    '''
 
-    def check_satisfiability(self, line: dict):
-        # After Z3 expression is parsed, call Solver
-        s = z3.Solver()
+    def get_query_timeout(self):
+        timeout = self.query_timeout
+        if self.time_budget is not None:
+            remaining = self.time_budget - (time.perf_counter() - self.start)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
 
-        # Take all of the constraints in member dictionary
-        # structure and add to the new Z3 model solver instance
-        for k, v in self.constraints.items():
-            expr = get_expr(v)
-            if not expr == None:
-                s.add(expr)
+    '''
+    CUT_OFF - record that exploration did not finish
+    '''
+
+    def cut_off(self, reason: str):
+        self.complete = False
+        if self.cutoff is None:
+            self.cutoff = reason
+
+    '''
+    DETECT_DEPTH_LIMIT
+    branches nested deeper than max_depth are not explored
+    '''
+
+    def detect_depth_limit(self, depth: int) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            self.cut_off('depth')
+            return True
+        return False
+
+    '''
+    CHECK_SATISFIABILITY
+    side: branch of line the path is entering (cfg.CheckOp)
+    '''
+
+    def check_satisfiability(self, line: ast.stmt, side: str):
+        satisfied = self.solve(line)
 
         # store constraints in local variable for easy
         z3e = self.constraints
 
-        satisfied = s.check()
         if satisfied == z3.sat:
-            model = s.model()
+            self.stats['sat'] += 1
+            self.reached.add((line.lineno, side))
+            model = self.session.model()
             test_case = TestCase(model, self.args)
             self.tests.append(test_case)
             self.expressions.append(get_expr(z3e))
             return model
 
+        # neither sat nor unsat, do not report it as dead code
+        elif satisfied == z3.unknown:
+            self.stats['unknown'] += 1
+            err = Undecided(z3e, line.lineno, self.session.reason_unknown())
+            self.report_violation(self.undecided, err)
+            return False
+
         # store the error/ and continue parsing
         else:
-            err = CEViolation(z3e, line['lineno'])
-            self.errors.append(err)
+            self.stats['unsat'] += 1
+            self.dead.setdefault((line.lineno, side),
+                                 CEViolation(z3e, line.lineno))
             return False
 
-    'DETECT LINE SKIP'
+    '''
+    SOLVE
+    line: statement the query is made for, metrics are kept per line
+    '''
 
-    def detect_line_skip(self, line) -> bool:
-        return line['lineno'] in self.skip_lines
+    def solve(self, line: ast.stmt):
+        # After Z3 expression is parsed, check the constraints of the
+        # current path against the function's incremental solver.
+        # Constraints already asserted in an open scope are only re-assumed.
+        if self.tracer is not None:
+            self.tracer.on_solve(self, line, 'start')
+
+        constraints = self.constraints.values()
+        start = time.perf_counter()
+        checks = self.session.checks
+        satisfied = self.session.check(constraints, self.get_query_timeout())
+        checks = self.session.checks - checks
+        self.metrics.record_solve(line.lineno, str(satisfied),
+                                  time.perf_counter() - start,
+                                  len(constraints), checks)
+        self.stats['solver_calls'] += 1
+        # answered by the query caches (or trivially) without calling Z3
+        if checks == 0:
+            self.stats['cached_queries'] += 1
+
+        if self.tracer is not None:
+            self.tracer.on_solve(self, line, 'end', satisfied)
+        return satisfied
 
     '''
-    DETECT VAR
+    REPORT_DEAD
+    branches unsatisfiable on every path that got to them, a branch only
+    unsatisfiable on some paths (e.g. the ones leaving a loop early) is
+    not dead code
     '''
 
-    def detect_var(self, line) -> bool:
-        line_type = line['_type']
-        return line_type == 'AnnAssign'
+    def report_dead(self):
+        for key, err in self.dead.items():
+            if key not in self.reached:
+                self.report_violation(self.errors, err)
 
     '''
-    DETECT_VAR_CHANGE
+    REPORT_VIOLATION - add to errors/undecided/bounded and tell the tracer
     '''
 
-    def detect_var_change(self, line) -> bool:
-        line_type = line['_type']
-        return line_type == 'Assign'
+    def report_violation(self, violations: list, violation: CEViolation):
+        violations.append(violation)
+        if self.tracer is not None:
+            self.tracer.on_violation(self, violation)
 
     '''
-    DETECT_OR_ELSE
+    HANDLE_NOOP - statements without effect on the engine
     '''
 
-    def detect_or_else(self, line) -> bool:
-        line_type = line['_type']
-        return line_type == 'Assign'
+    def handle_noop(self, op, depth=0):
+        pass
 
     '''
-    DETECT_BRANCHING
+    HANDLE_ERROR - statement which could not be lowered
     '''
 
-    def detect_branching(self, line) -> bool:
-        line_type = line['_type']
-        # limit implementation to only handle IF statements for now
-        return line_type == 'If'
+    def handle_error(self, op, depth=0):
+        raise op.error
 
     '''
-    DETECT_WHILE_LOOP
+    HANDLE_CHECK
     '''
 
-    def detect_while_loop(self, line) -> bool:
-        line_type = line['_type']
-        return line_type == 'While'
+    def handle_check(self, op, depth=0):
+        self.check_satisfiability(op.line, op.side)
 
     '''
     HANDLE_BRANCHING
      If(expr test, stmt* body, stmt* orelse)
     '''
 
-    def handle_branching(self, line, depth=0):
-        pre_branch_constraints = copy.deepcopy(self.constraints)
+    def handle_branching(self, op, depth=0):
+        if self.merge and op.mergeable:
+            self.handle_merge(op)
+            return
+
+        # the path condition is persistent, keeping a reference is the fork
+        pre_branch_constraints = self.constraints
+
+        if self.detect_depth_limit(depth+1):
+            return
 
-        z3e = self.generate_test_expr(line['test'])
+        z3e = self.generate_test_expr(op.test)
+        decided = self.decide(z3e)
+        if self.tracer is not None:
+            self.tracer.on_branch(self, op.line, decided)
 
         negate_z3e = None
         try:
@@ -512,59 +1157,387 @@ class FunctionParser():
         except Exception as e:
             print(f"cannot negate expression {z3e}")
 
-        if 'body' in line:
-            for sub_line in line['body']:
-                self.parse_body_line(sub_line, depth+1)
-
-        self.check_satisfiability(line)
+        # then-branch: run the body, then check the path it leaves behind
+        states = []
+        if decided is False:
+            self.report_decided(op.line, 'then')
+        else:
+            states.append(self.new_state(op.then_block, depth+1))
 
         self.constraints = pre_branch_constraints
 
         # process or-else blocks
-        if not negate_z3e == None:
-            self.handle_or_else(negate_z3e, line)
+        if decided is True:
+            if op.else_block is not None:
+                self.store_constraint(negate_z3e)
+                self.report_decided(op.line, 'else')
+        elif not negate_z3e == None:
+            states.extend(self.handle_or_else(negate_z3e, op, depth))
 
         # again, restore constraints
         self.constraints = pre_branch_constraints
+        if states:
+            self.fork(states, op.line)
+
+    '''
+    DECIDE
+    True/False when a test is constant once simplified, None otherwise
+    '''
+
+    def decide(self, z3e):
+        expr = get_expr(z3e)
+        if isinstance(expr, bool):
+            return expr
+        if not z3.is_expr(expr):
+            return None
+
+        expr = self.session.simplify(expr)
+        if z3.is_true(expr):
+            return True
+        if z3.is_false(expr):
+            return False
+        return None
+
+    '''
+    REPORT_DECIDED
+    a branch whose test simplified to False is dead code, reported without
+    asking the solver
+    '''
+
+    def report_decided(self, line: ast.stmt, side: str):
+        self.stats['unsat'] += 1
+        self.stats['decided'] += 1
+        self.metrics.record_decided(line.lineno)
+        self.dead.setdefault((line.lineno, side),
+                             CEViolation(self.constraints, line.lineno))
+
+    '''
+    HANDLE_MERGE
+    state merging (veritesting style): both sides are applied to the same
+    pre-branch state and every variable constraint they touch is joined
+    into If(test, then_constraint, else_constraint), so the path carries
+    on once instead of forking and solving per side.
+    '''
+
+    def handle_merge(self, op):
+        pre_branch_constraints = self.constraints
+        pre_branch_vars = list(self.vars)
+        self.stats['merged'] += 1
+
+        # generate_test_expr stores the test on the path, only the
+        # expression itself is needed to guard the merged values
+        test = self.generate_test_expr(op.test)
+        self.constraints = pre_branch_constraints
+
+        # both sides only define fresh versions, their definitions can all
+        # stay on the path
+        for sub_op in op.then_ops:
+            self.exec_op(sub_op)
+        then_vars = self.vars
+
+        self.vars = list(pre_branch_vars)
+        for sub_op in op.else_ops:
+            self.exec_op(sub_op)
+        else_vars = self.vars
+
+        self.vars = list(pre_branch_vars)
+        for slot, pre_var in enumerate(pre_branch_vars):
+            then_var = then_vars[slot]
+            else_var = else_vars[slot]
+            if then_var is pre_var and else_var is pre_var:
+                continue
+
+            # a variable bound on one side only keeps that binding
+            if then_var is UNBOUND:
+                then_var = else_var
+            if else_var is UNBOUND:
+                else_var = then_var
+            if then_var is None or else_var is None:
+                continue
+
+            key, z3_var = self.new_version(slot, then_var.sort())
+            self.constraints = self.constraints.set(
+                key, lambda z3_var=z3_var, then_var=then_var, else_var=else_var:
+                    z3_var == z3.If(z3tools.get_z3_bool(get_expr(test)),
+                                    then_var, else_var))
 
     '''
     HANDLE_OR_ELSE
     '''
 
-    def handle_or_else(self, negate_z3e, line=dict):
-        if 'orelse' not in line:
-            return
+    def handle_or_else(self, negate_z3e, op, depth=0) -> list:
+        if op.else_block is None:
+            return []
 
-        orelse_lines = line['orelse']
-        if len(orelse_lines) > 0:
-            self.store_constraint(negate_z3e)
-            self.check_satisfiability(line)
-            for oeline in orelse_lines:
-                self.parse_body_line(oeline)
+        # else-branch: check the negated test first, then run the block
+        self.store_constraint(negate_z3e)
+        return [self.new_state(op.else_block, depth+1)]
 
     '''
     HANDLE_WHILE_LOOP
     While(expr test, stmt* body, stmt* orelse)
     '''
 
-    def handle_while_loop(self, line=dict):
-        pre_branch_constraints = copy.deepcopy(self.constraints)
-        z3e = self.generate_test_expr(line['test'])
-        body = line['body']
+    def handle_while_loop(self, op, depth=0):
+        loop = op.loop
+        self.target = loop.exit
+        if self.unroll is not None:
+            self.handle_loop_iteration(loop, 0, self.unroll, depth)
+            return
+
+        pre_branch_constraints = self.constraints
+
+        if self.detect_depth_limit(depth+1):
+            return
+
+        z3e = self.generate_test_expr(loop.test)
+        if self.tracer is not None:
+            self.tracer.on_branch(self, op.line, None)
 
-        skip_lines = []
         self.store_constraint(z3e)
-        self.check_satisfiability(line)
 
-        for line in body:
-            self.parse_body_line(line)
+        # loop body: check the loop test, walk the body once, then mark the
+        # loop as walked, later visits only check the test
+        block = loop.revisit if loop.id in self.walked else loop.once
+        state = self.new_state(block, depth+1)
+
+        self.constraints = pre_branch_constraints
+        self.fork([state], op.line)
+
+    '''
+    HANDLE_WALKED - end of a loop body walked once
+    '''
+
+    def handle_walked(self, op, depth=0):
+        self.walked.add(op.loop.id)
 
-            lineno = line['lineno']
-            if lineno not in skip_lines:
-                skip_lines.append(lineno)
+    '''
+    HANDLE_LOOP_ITERATION
+    bounded unrolling: iteration i forks a path entering the body under the
+    loop test and continues the current path past the loop (in its exit
+    block) under its negation. The entering path comes back to the header
+    through the body's LatchOp, so each iteration only extends the path
+    (and the open solver scopes) of the previous one, and the code after
+    the loop runs on every path leaving it. An exit the loop cannot take
+    at this iteration is dropped. At the bound the path leaves the loop
+    with every variable the loop assigns unknown (havoc), standing in for
+    all the iterations that were not unrolled.
+    '''
 
-        self.skip_lines.extend(skip_lines)
+    def handle_loop_iteration(self, loop, iteration: int, bound: int,
+                              depth=0):
+        pre_branch_constraints = self.constraints
+        line = loop.line
+
+        z3e = self.generate_test_expr(loop.test)
+        decided = self.decide(z3e)
+        if self.tracer is not None:
+            self.tracer.on_branch(self, line, decided)
+
+        if decided is False:
+            if iteration == 0:
+                self.report_decided(line, 'loop')
+        elif iteration >= bound:
+            self.check_loop_bound(line, bound)
+            self.constraints = pre_branch_constraints
+            self.havoc(loop.assigned)
+            z3e = self.generate_test_expr(loop.test)
+            decided = self.decide(z3e)
+        elif not self.detect_depth_limit(depth+1):
+            loops = dict(self.running.loops)
+            loops[loop.id] = iteration
+            self.fork([self.new_state(loop.body, depth+1, loops)], line)
+
+        # exit the loop, unless the test holds for sure
         self.constraints = pre_branch_constraints
+        self.target = loop.exit
+        if decided is True:
+            self.pruned = True
+            return
+
+        try:
+            self.store_constraint(
+                z3tools.py2z3_op_map['Not'](get_expr(z3e)))
+        except Exception as e:
+            print(f"cannot negate expression {z3e}")
+            return
+
+        if decided is None and self.solve(line) == z3.unsat:
+            self.pruned = True
+
+    '''
+    HAVOC - fresh, unconstrained versions of the variables of slots
+    '''
+
+    def havoc(self, slots: list):
+        for slot in slots:
+            z3_var = self.vars[slot]
+            if z3.is_expr(z3_var):
+                self.new_version(slot, z3_var.sort())
+
+    '''
+    HANDLE_LATCH - back edge, the next iteration of the running one
+    '''
+
+    def handle_latch(self, op, depth=0):
+        self.handle_loop_iteration(op.loop, self.running.loops[op.loop.id] + 1,
+                                   self.get_unroll_bound(), depth)
+
+    '''
+    GET_UNROLL_BOUND
+    '''
+
+    def get_unroll_bound(self) -> int:
+        return self.unroll if self.unroll is not None else DEFAULT_UNROLL
+
+    '''
+    HANDLE_LOOP_ENTRY
+    '''
+
+    def handle_loop_entry(self, op, depth=0):
+        self.check_loop_entry(op.loop.line, self.running.loops[op.loop.id])
+
+    '''
+    CHECK_LOOP_ENTRY
+    an unreachable first iteration is dead code, a later one just means the
+    loop has always ended by then, the path is dropped either way
+    '''
+
+    def check_loop_entry(self, line: ast.While, iteration: int):
+        if iteration == 0:
+            if self.check_satisfiability(line, 'loop') is False:
+                self.pruned = True
+            return
+
+        satisfied = self.solve(line)
+        if satisfied == z3.sat:
+            self.stats['sat'] += 1
+            self.tests.append(TestCase(self.session.model(), self.args))
+        else:
+            self.pruned = True
+
+    '''
+    CHECK_LOOP_BOUND
+    the path would enter another iteration past the unrolling bound
+    '''
+
+    def check_loop_bound(self, line: ast.While, bound: int):
+        satisfied = self.solve(line)
+        if satisfied != z3.unsat:
+            self.report_violation(self.bounded,
+                                  LoopBound(self.constraints, line.lineno,
+                                            bound))
+
+    '''
+    HANDLE_FOR_LOOP
+     For(expr target, expr iter, stmt* body, stmt* orelse)
+    only counted loops over range() are supported. Loops whose body just
+    accumulates into Ints (+=/-= by loop invariant values or by the loop
+    variable) are summarized in closed form over the symbolic trip count,
+    any other body falls back to unrolling.
+    '''
+
+    def handle_for_loop(self, op, depth=0):
+        self.target = op.exit
+        if op.loop is None:
+            print(f"DEBUG: unsupported for loop: line {op.lineno}")
+            return
+
+        if op.summary is not None:
+            increments = self.get_increments(op)
+            if increments is not None:
+                self.summarize_for_loop(op, increments)
+                return
+
+        self.handle_var_change(op.init)
+        self.handle_loop_iteration(op.loop, 0, self.get_unroll_bound(), depth)
+
+    '''
+    GET_INCREMENTS
+    (slot, value, negated) per accumulation of a summarizable loop, value
+    evaluated on the running path (None for the loop variable). None when
+    an accumulator is unbound or an accumulator or increment is not an Int,
+    such loops are unrolled.
+    '''
+
+    def get_increments(self, op):
+        increments = []
+        for slot, value, negated in op.summary:
+            if not z3tools.is_int_value(self.vars[slot]):
+                return None
+            if value is not None:
+                value = value(self)
+                if not z3tools.is_int_value(value):
+                    return None
+            increments.append((slot, value, negated))
+        return increments
+
+    '''
+    SUMMARIZE_FOR_LOOP
+    with n the number of iterations, each accumulator ends at
+    acc + n*c for a loop invariant c, or at
+    acc + n*start + step*n*(n-1)/2 when the loop variable itself is added,
+    and the loop variable ends at start + (n-1)*step when the body ran.
+    '''
+
+    def summarize_for_loop(self, op, increments: list):
+        self.stats['summarized'] += 1
+
+        start = op.start(self)
+        stop = op.stop(self)
+        step = op.step
+        trips = self.get_trip_count(start, stop, step)
+
+        # the body is reachable when the loop runs at least once
+        pre_loop_constraints = self.constraints
+        self.store_constraint(trips > 0)
+        self.check_satisfiability(op.line, 'loop')
+        self.constraints = pre_loop_constraints
+
+        self.covered.update(op.body_lines)
+
+        # every accumulation reads the bindings from before the loop
+        totals = {}
+        for slot, value, negated in increments:
+            if value is None:
+                total = trips * start + step * trips * (trips - 1) / 2
+            else:
+                total = trips * value
+
+            if negated:
+                total = -total
+            totals[slot] = total if slot not in totals \
+                else totals[slot] + total
+
+        for slot, total in totals.items():
+            value = self.vars[slot] + total
+            key, z3_var = self.new_version(slot, self.vars[slot].sort())
+            self.constraints = self.constraints.set(
+                key, lambda z3_var=z3_var, value=value: z3_var == value)
+
+        last = start + (trips - 1) * step
+        old_var = self.vars[op.target]
+        key, z3_var = self.new_version(op.target, z3.IntSort())
+        if z3.is_expr(old_var):
+            value = z3.If(trips > 0, z3_var == last, z3_var == old_var)
+        else:
+            value = z3.Implies(trips > 0, z3_var == last)
+        self.constraints = self.constraints.set(key, value)
+
+    '''
+    GET_TRIP_COUNT
+    number of values range(start, stop, step) yields, as a Z3 expression
+    '''
+
+    def get_trip_count(self, start, stop, step: int):
+        start = z3.IntVal(start) if isinstance(start, int) else start
+        stop = z3.IntVal(stop) if isinstance(stop, int) else stop
+
+        if step > 0:
+            trips = z3.If(stop > start, (stop - start + step - 1) / step, 0)
+        else:
+            trips = z3.If(start > stop, (start - stop - step - 1) / -step, 0)
+        return z3.simplify(trips)
 
     '''
     HANDLE_VAR
@@ -572,75 +1545,164 @@ class FunctionParser():
     Annotation Assignment, required
     '''
 
-    def handle_var(self, line):
+    def handle_var(self, op, depth=0):
         # store variables in Z3 context
 
-        var_name = line['target']['id']
-        var_type = line['annotation']['id']
-        z3_var = z3tools.get_z3_var(var_name, var_type)
-        self.vars[var_name] = z3_var
-
-        # add a constraint for the variable
-        var_value = self.get_expr_value(line['value'])
-        if var_type == 'str':
+        # add a constraint for the variable, the value refers to the
+        # bindings from before this assignment
+        var_value = op.value(self)
+        if op.var_type == 'str' and var_value is not None:
             var_value = z3tools.get_z3_str_value(var_value)
 
-        self.constraints[var_name] = lambda: (z3_var == var_value)
+        z3_var = z3tools.get_z3_var(op.name, op.var_type)
+        if z3_var is None:
+            self.vars[op.slot] = z3_var
+            return
+
+        key, z3_var = self.new_version(op.slot, z3_var.sort())
+        # a value the engine cannot compute leaves the version free
+        if var_value is None:
+            return
+
+        self.bind_concrete(key, var_value)
+        self.constraints = self.constraints.set(
+            key, lambda: (z3_var == var_value))
 
     '''
     HANDLE_VAR_CHANGE
     Assign(expr* targets, expr value, string? type_comment)
     '''
 
-    def handle_var_change(self, line):
+    def handle_var_change(self, op, depth=0):
+
+        # add a constraint for the variable
+        var_value = op.value(self)
 
-        for target in line['targets']:
-            var_name = target['id']
+        for slot in op.targets:
+            if isinstance(slot, Exception):
+                raise slot
 
-            z3_var = self.vars[var_name]
+            # variables that were never annotated take the value's sort
+            z3_var = self.vars[slot]
+            sort = z3_var.sort() if z3.is_expr(z3_var) \
+                else z3tools.get_z3_sort(var_value)
+            if sort is None:
+                continue
 
-            # add a constraint for the variable
-            var_value = self.get_expr_value(line['value'])
+            key, z3_var = self.new_version(slot, sort)
+            # a value the engine cannot compute leaves the version free
+            if var_value is None:
+                continue
 
-            self.constraints[var_name] = lambda: (z3_var == var_value)
+            self.bind_concrete(key, var_value)
+            self.constraints = self.constraints.set(
+                key, lambda z3_var=z3_var: (z3_var == var_value))
 
     '''
-    GENERATE_TEST_EXPR
+    NEW_VERSION
+    SSA: each assignment binds the variable of a slot to a fresh Z3 constant
+    (name, name!1, name!2, ...) so earlier constraints keep the value they
+    were made with
     '''
 
-    def generate_test_expr(self, test: dict):
-        test_type = test['_type']
+    def new_version(self, slot: int, sort):
+        var_name = self.names[slot]
+        version = self.versions.get(var_name)
+        version = 0 if version is None else version + 1
+        self.versions[var_name] = version
 
-        def z3e(): return False
+        key = var_name if version == 0 else f"{var_name}!{version}"
+        z3_var = z3.Const(key, sort)
+        self.vars[slot] = z3_var
+        self.declared.setdefault(var_name)
+        return key, z3_var
 
-        if test_type == 'Name':
-            var_name = test['id']
-            z3_var = self.vars[var_name]
-            def z3e(): return z3_var == True
+    '''
+    BIND_CONCRETE
+    remember the value of a version assigned a concrete number/bool. Each
+    version is assigned once, so this holds on every path it exists on.
+    '''
+
+    def bind_concrete(self, key: str, value):
+        if isinstance(value, (bool, int, float)):
+            self.concrete[key] = value
+
+    '''
+    GET_VAR - Z3 constant (or value) bound to a slot, KeyError when unbound
+    '''
+
+    def get_var(self, slot: int):
+        z3_var = self.vars[slot]
+        if z3_var is UNBOUND:
+            raise KeyError(self.names[slot])
+        return z3_var
+
+    '''
+    FIND_VAR - like get_var, None when unbound
+    '''
+
+    def find_var(self, slot: int):
+        z3_var = self.vars[slot]
+        return None if z3_var is UNBOUND else z3_var
+
+    '''
+    GET_BINDING
+    the concrete value of a variable when known, else its Z3 constant
+    '''
+
+    def get_binding(self, slot: int):
+        z3_var = self.get_var(slot)
+        if z3.is_expr(z3_var):
+            return self.concrete.get(z3_var.decl().name(), z3_var)
+        return z3_var
 
-        if test_type in ['UnaryOp', 'BoolOp']:
-            op_type = test['op']['_type']
+    '''
+    BINDINGS - variable name -> value bound on the running path
+    '''
 
-            # self.expr = f"{op_type}({self.build_test_expr(test)})"
-            z3_op = z3tools.get_z3_op_type(op_type)
-            z3e = z3_op(*self.build_z3e(test))
+    def bindings(self) -> dict:
+        return {name: value for name, value in zip(self.names, self.vars)
+                if value is not UNBOUND}
 
-        if test_type == 'Compare':
-            z3e = self.handle_compare(test)
+    '''
+    GENERATE_TEST_EXPR
+    test: template of the If/While test (cfg.py), stored on the path
+    '''
 
+    def generate_test_expr(self, test):
+        z3e = test(self)
         self.store_constraint(z3e)
         return z3e
 
     '''
-    HANDLE COMPARE
+    GET_TEST - test of a bare name
+    '''
+
+    def get_test(self, slot: int):
+        z3_var = self.get_binding(slot)
+        if z3.is_expr(z3_var):
+            def z3e(): return z3_var == True
+            return z3e
+        return bool(z3_var)
+
+    '''
+    APPLY_OP - Z3 operator of an operator name
     '''
 
-    def handle_compare(self, test):
-        op_type = test['ops'][0]['_type']
+    def apply_op(self, op_type: str, operands: list):
+        z3_op = z3tools.get_z3_op_type(op_type)
+        return z3_op(*operands)
+
+    '''
+    APPLY_COMPARE
+    '''
 
-        comparator = test['comparators'][0]
-        op_value = self.get_expr_value(comparator)
-        left_expr = self.get_expr_value(test['left'])
+    def apply_compare(self, op_type: str, left_expr, op_value):
+        folded = z3tools.fold(op_type, left_expr, op_value)
+        if folded is None:
+            folded = z3tools.apply_reflected(op_type, left_expr, op_value)
+        if folded is not None:
+            return folded
 
         z3_op = z3tools.get_z3_op_type(op_type)
 
@@ -664,105 +1726,63 @@ class FunctionParser():
                     print(e3)
 
     '''
-    GET EXPRESSION VALUE
-    recursive function to evaluate out test expressions
+    APPLY_BINOP
     '''
 
-    def get_expr_value(self, expr: dict):
-        if 'id' in expr:
-            expr_id = expr['id']
-            return self.vars[expr_id]
+    def apply_binop(self, op_type: str, left, right):
+        # an operand the engine could not compute
+        if left is None or right is None:
+            return None
 
-        if 'value' in expr:
-            return expr['value']
+        folded = z3tools.fold(op_type, left, right)
+        if folded is None:
+            folded = z3tools.apply_reflected(op_type, left, right)
+        if folded is not None:
+            return folded
 
-        if 'left' in expr:
-            left = self.get_expr_value(expr['left'])
-            right = self.get_expr_value(expr['right'])
-            op_type = expr['op']['_type']
-            z3_op = z3tools.get_z3_op_type(op_type)
+        z3_op = z3tools.get_z3_op_type(op_type)
+        try:
+            return z3_op(left, right)
+        except Exception as e:
             try:
+                z3_op = z3tools.get_z3_bkup_op_type(op_type)
                 return z3_op(left, right)
-            except Exception as e:
+            except Exception as e2:
                 try:
-                    z3_op = z3tools.get_z3_bkup_op_type(op_type)
-                    return z3_op(left, right)
-                except Exception as e2:
-                    try:
-                        z3_op = z3tools.get_z3_str_op_type(op_type)
-                        expr = z3_op(z3tools.get_z3_str_value(
-                            left), z3tools.get_z3_str_value(right))
-                        return expr
-                    except Exception as e3:
-                        print(e)
-                        print(e2)
-                        print(e3)
-
-        if 'op' in expr:
-            operand = self.get_expr_value(expr['operand'])
-            op_type = expr['op']['_type']
-            z3_op = z3tools.get_z3_op_type(op_type)
-            return z3_op(operand)
-
-    '''
-    STORE_CONSTRAINT
-    '''
-
-    def store_constraint(self, expr):
-        for i in range(0, 1000):
-            if i in self.constraints:
-                continue
-            self.constraints[i] = expr
-            break
+                    z3_op = z3tools.get_z3_str_op_type(op_type)
+                    expr = z3_op(z3tools.get_z3_str_value(
+                        left), z3tools.get_z3_str_value(right))
+                    return expr
+                except Exception as e3:
+                    print(e)
+                    print(e2)
+                    print(e3)
 
     '''
-    BUILD_Z3E
-    recursive function to consume/traverse the AST
+    APPLY_UNARYOP
     '''
 
-    def build_z3e(self, test: dict) -> list:
-        sub_expr: list = []
+    def apply_unaryop(self, op_type: str, operand):
+        if operand is None:
+            return None
 
-        if 'values' in test:
-            values = test['values']
-            length = len(values)
-            for i in range(length):
-                value = values[i]
-                sub_expr.append(self.handle_expr_values(value))
+        folded = z3tools.fold(op_type, operand)
+        if folded is not None:
+            return folded
 
-        elif 'op' in test:
-            var_name = test['operand']['id']
-            z3_var = self.vars[var_name]
-            sub_expr.append(z3_var)
-
-        return sub_expr
+        z3_op = z3tools.get_z3_op_type(op_type)
+        try:
+            return z3_op(operand)
+        except Exception as e:
+            z3_op = z3tools.get_z3_bkup_op_type(op_type)
+            return z3_op(operand)
 
     '''
-    HANDLE_EXPR_VALUES
+    STORE_CONSTRAINT
     '''
 
-    def handle_expr_values(self, value):
-        var_name = value['id'] if 'id' in value else ''
-        inner_op = value['_type'] if '_type' in value else ''
-        inner_op_type = value['op']['_type'] if 'op' in value else ''
-
-        if(inner_op == 'UnaryOp'):
-            var_name = value['operand']['id']
-        elif(inner_op == 'Compare'):
-            return self.handle_compare(value)
-
-        if inner_op_type:
-            inner_z3_op = z3tools.get_z3_op_type(inner_op_type)
-            inner_z3_operands = None
-            if var_name:
-                if var_name in self.vars:
-                    inner_z3_operands = self.vars[var_name]
-            else:
-                inner_z3_operands = self.build_z3e(value)
-
-            return inner_z3_op(inner_z3_operands)
-        elif var_name:
-            return self.vars[var_name]
+    def store_constraint(self, expr):
+        self.constraints = self.constraints.append(expr)
 
     '''
     GET CONSTRAINT VAR
@@ -0,0 +1,137 @@
+'''
+
+Tracer hooks of the FunctionParser.
+
+A Tracer is told what the engine does while it explores a function, for
+profiling or custom analyses, without patching FunctionParser methods.
+Subclass Tracer, override the hooks of interest and register it with
+FunctionParser.add_tracer (or the tracer argument of FileParser/
+ModuleParser). Every hook gets the FunctionParser first, so a tracer can
+look at the running state (parser.running), the path condition
+(parser.constraints) and the bindings (parser.bindings()). Statements
+reach on_line as the ast nodes they were lowered from (cfg.py).
+
+The parser only checks whether a tracer is registered at each hook site,
+with none registered nothing else is done.
+
+'''
+import sys
+import time
+
+
+'''
+Tracer - base class, every hook does nothing
+'''
+
+
+class Tracer():
+
+    '''
+    ON_LINE - a statement is about to be executed
+    '''
+
+    def on_line(self, parser, line, depth: int):
+        pass
+
+    '''
+    ON_BRANCH
+    an If/While test was evaluated. decided: True/False when the test is
+    constant on this path, None when both sides are explored
+    '''
+
+    def on_branch(self, parser, line, decided):
+        pass
+
+    '''
+    ON_SOLVE
+    phase: 'start' before a solver query and 'end' after it, with its
+    result (z3.sat/unsat/unknown)
+    '''
+
+    def on_solve(self, parser, line, phase: str, result=None):
+        pass
+
+    '''
+    ON_PATH_COMPLETE - a state ran to the end of the function
+    '''
+
+    def on_path_complete(self, parser, state):
+        pass
+
+    '''
+    ON_VIOLATION
+    a CEViolation, Undecided or LoopBound was reported. Dead branches
+    (CEViolation) are only known, and reported, once every path was run.
+    '''
+
+    def on_violation(self, parser, violation):
+        pass
+
+
+'''
+TracerGroup - several tracers registered on one parser
+'''
+
+
+class TracerGroup(Tracer):
+
+    def __init__(self, tracers: list):
+        self.tracers = list(tracers)
+
+    def add(self, tracer: Tracer):
+        self.tracers.append(tracer)
+
+    def on_line(self, parser, line, depth: int):
+        for tracer in self.tracers:
+            tracer.on_line(parser, line, depth)
+
+    def on_branch(self, parser, line, decided):
+        for tracer in self.tracers:
+            tracer.on_branch(parser, line, decided)
+
+    def on_solve(self, parser, line, phase: str, result=None):
+        for tracer in self.tracers:
+            tracer.on_solve(parser, line, phase, result)
+
+    def on_path_complete(self, parser, state):
+        for tracer in self.tracers:
+            tracer.on_path_complete(parser, state)
+
+    def on_violation(self, parser, violation):
+        for tracer in self.tracers:
+            tracer.on_violation(parser, violation)
+
+
+'''
+PrintTracer - writes every event as a line, for --trace
+'''
+
+
+class PrintTracer(Tracer):
+
+    def __init__(self, out=sys.stderr):
+        self.out = out
+        self.solve_start = None
+
+    def emit(self, parser, event: str, detail: str):
+        print(f"[{parser.name}] {event} {detail}", file=self.out)
+
+    def on_line(self, parser, line, depth: int):
+        self.emit(parser, 'line', f"{line.lineno} depth={depth}")
+
+    def on_branch(self, parser, line, decided):
+        self.emit(parser, 'branch', f"{line.lineno} decided={decided}")
+
+    def on_solve(self, parser, line, phase: str, result=None):
+        if phase == 'start':
+            self.solve_start = time.perf_counter()
+            return
+        elapsed = time.perf_counter() - self.solve_start
+        self.emit(parser, 'solve', f"{line.lineno} {result} {elapsed:.6f}s")
+
+    def on_path_complete(self, parser, state):
+        self.emit(parser, 'path', f"{parser.stats['paths']} complete")
+
+    def on_violation(self, parser, violation):
+        self.emit(parser, 'violation',
+                  f"{violation.lineno} {type(violation).__name__}")
@@ -1,4 +1,5 @@
 from z3 import *
+import operator
 
 # build out a mapping from 'AST' generated python string representation Operators
 # to Z3's ArithReference
@@ -16,6 +17,7 @@ py2z3_op_map: dict = {
     'LtE': ArithRef.__le__,
     'GtE': ArithRef.__ge__,
     'Mod': ArithRef.__mod__,
+    'USub': ArithRef.__neg__,
 }
 
 # Fallback execution to evaluate expressions between Z3 and Python.
@@ -28,6 +30,7 @@ py2z3_bkup_op_map: dict = {
     'Sub': int.__sub__,
     'Mul': int.__mul__,
     'Eq': int.__eq__,
+    'USub': int.__neg__,
 }
 # Fallback execution to evaluate expressions between Z3 and Python.
 # May handle some Type inference
@@ -43,6 +46,43 @@ py2z3_str_op_map: dict = {
     'GtE': SeqRef.__ge__,
 }
 
+# division and modulo of two ints as Z3 computes them on Ints (euclidean,
+# the remainder is never negative), so folding agrees with the solver. Any
+# other operands (floats, a Z3 expression) go through python's operators.
+def int_div(left, right):
+    if not isinstance(left, int) or not isinstance(right, int):
+        return operator.truediv(left, right)
+
+    quotient = left // right
+    if left - quotient * right < 0:
+        quotient += 1
+    return quotient
+
+
+def int_mod(left, right):
+    if not isinstance(left, int) or not isinstance(right, int):
+        return operator.mod(left, right)
+    return left - right * int_div(left, right)
+
+
+# Python evaluation of operators whose operands are all concrete values
+py_op_map: dict = {
+    'Not': operator.not_,
+    'Add': operator.add,
+    'Sub': operator.sub,
+    'Mul': operator.mul,
+    'Div': int_div,
+    'FloorDiv': operator.floordiv,
+    'Mod': int_mod,
+    'USub': operator.neg,
+    'Eq': operator.eq,
+    'NotEq': operator.ne,
+    'Gt': operator.gt,
+    'Lt': operator.lt,
+    'LtE': operator.le,
+    'GtE': operator.ge,
+}
+
 # Mapping from Python dict key in string form to Z3 type
 py2z3_var_map: dict = {
     'bool': Bool,
@@ -65,6 +105,53 @@ def get_z3_var(var_name: str, var_type: str):
     print(f"DEBUG: missing var_type: {var_type}")
 
 
+# constant fold an operator, None when an operand is symbolic (or the
+# operation fails, e.g. division by zero, which is left to the solver)
+def fold(op_type, *operands):
+    if op_type not in py_op_map:
+        return None
+    for operand in operands:
+        if not isinstance(operand, (bool, int, float, str)):
+            return None
+
+    try:
+        return py_op_map[op_type](*operands)
+    except Exception:
+        return None
+
+
+# operator on a concrete left operand and a symbolic right one, the Z3
+# methods need the expression as self, python's operators fall back to the
+# reflected method (e.g. 1 + x -> x.__radd__(1))
+def apply_reflected(op_type, left, right):
+    if op_type in py_op_map and not is_expr(left) and is_expr(right):
+        return py_op_map[op_type](left, right)
+    return None
+
+
+# Int sorted expression or python int (bools excluded), what closed form
+# loop summaries can be computed over
+def is_int_value(value):
+    if is_expr(value):
+        return is_int(value)
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+# Z3 sort of an assigned value, used to version variables which were never
+# annotated
+def get_z3_sort(value):
+    if is_expr(value):
+        return value.sort()
+    if isinstance(value, bool):
+        return BoolSort()
+    if isinstance(value, int):
+        return IntSort()
+    if isinstance(value, str):
+        return StringSort()
+
+    print(f"DEBUG: missing sort for value: {value}")
+
+
 def get_z3_bkup_op_type(op_type):
     if op_type in py2z3_bkup_op_map:
         return py2z3_bkup_op_map[op_type]
@@ -81,3 +168,12 @@ def get_z3_str_op_type(op_type):
 
 def get_z3_str_value(val):
     return StringVal(val)
+
+
+# a missing (None) constraint holds trivially
+def get_z3_bool(val):
+    if val is None:
+        return BoolVal(True)
+    if isinstance(val, bool):
+        return BoolVal(val)
+    return val
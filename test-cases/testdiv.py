@@ -0,0 +1,20 @@
+def test_div(x: int):
+    y: int = 7
+    z: int = y / 2
+
+    if z == 3:
+        return 1
+
+    if x / 2 == 3:
+        return 2
+
+
+def test_mod(x: int):
+    y: int = 7
+    z: int = y % -2
+
+    if z == 1:
+        return 1
+
+    if x % -2 == 1:
+        return 2
@@ -0,0 +1,40 @@
+# counted loops: summarized in closed form, or unrolled
+
+
+def test_func1(n: int = 0) -> int:
+
+    total: int = 0
+    count: int = 0
+    for i in range(n):
+        total += i
+        count += 2
+
+    if total == 45:
+        return 1
+    if count == 7:
+        return 2
+    if total < 0:
+        return 3
+
+
+def test_func2(a: int = 0, b: int = 10) -> int:
+
+    acc: int = 0
+    for j in range(a, b, 3):
+        acc -= 1
+
+    if acc == -4:
+        return 1
+    if j == b:
+        return 2
+
+
+def test_func3(n: int = 0) -> int:
+
+    x: int = 0
+    for i in range(n):
+        if i == 2:
+            x = x + 10
+
+    if x == 10:
+        return 1
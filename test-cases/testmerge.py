@@ -0,0 +1,22 @@
+# flat, assignment only branches (see --merge)
+
+
+def test_func1(a: int, b: bool) -> int:
+
+    x: int = 0
+    if a > 10:
+        x = 1
+    else:
+        x = 2
+
+    y: int = 0
+    if b:
+        y = 10
+
+    if x + y == 12:
+        return 1
+    if x + y == 3:
+        return 2
+
+    return 0
+
@@ -31,20 +31,22 @@ def test_func2(a: bool = True, b: int = 0) -> int:
             a = False
 
 
-# def test_func2(a: bool = True, b: int = 0) -> int:
-
-#     i: int = b
-#     while i <= 10:
-#         i = i + 1
-
-#         if i == 1:
-#             print(f"i = {i}")
-#         if i < 5:
-#             print(f"{i} < 5")
-#         elif i == 5:
-#             print(f"{i} == 5")
-#         else:
-#             print(f"{i} >= 5")
-
-#         if i > 10:
-#             a = False
+
+# loop carried state, needs --unroll to follow i across iterations
+def test_func3(a: bool = True, b: int = 0) -> int:
+
+    i: int = b
+    while i <= 10:
+        i = i + 1
+
+        if i == 1:
+            print(f"i = {i}")
+        if i < 5:
+            print(f"{i} < 5")
+        elif i == 5:
+            print(f"{i} == 5")
+        else:
+            print(f"{i} >= 5")
+
+        if i > 10:
+            a = False
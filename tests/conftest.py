@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules under src/ import each other as top-level modules
+SRC = os.path.join(os.path.dirname(__file__), os.pardir, 'src')
+sys.path.insert(0, os.path.abspath(SRC))
+
+TEST_CASES = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.pardir, 'test-cases'))
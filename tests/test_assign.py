@@ -0,0 +1,22 @@
+import ast
+
+from symbex import analyze_function
+
+
+def get_body(source: str) -> ast.FunctionDef:
+    return ast.parse(source).body[0]
+
+
+ANNOTATED = '''
+def f(s: str):
+    y: int = len(s)
+    if y > 3:
+        return 1
+    return 0
+'''
+
+def test_uncomputed_value_leaves_the_variable_free():
+    result = analyze_function(get_body(ANNOTATED))
+
+    assert result.errors == []
+    assert result.stats['sat'] == 1
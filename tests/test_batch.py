@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+from batch import iter_records
+from conftest import TEST_CASES
+
+
+def summarize(records):
+    return sorted((os.path.basename(r['file']), r.get('function'),
+                   len(r.get('errors', [])), 'error' in r) for r in records)
+
+
+def test_pool_yields_one_record_per_function():
+    paths = [os.path.join(TEST_CASES, 'testbools.py'),
+             os.path.join(TEST_CASES, 'testints.py')]
+
+    serial = list(iter_records(paths, jobs=1))
+    pooled = list(iter_records(paths, jobs=2))
+
+    assert summarize(pooled) == summarize(serial)
+    assert len(pooled) == 15
+
+
+def test_unreadable_file_is_one_error_record(tmp_path):
+    broken = tmp_path / 'broken.py'
+    broken.write_text('def f(:\n')
+
+    records = list(iter_records([str(broken)], jobs=2))
+    assert len(records) == 1
+    assert 'error' in records[0] and 'function' not in records[0]
+
+
+# Mult has no Z3 operator and the for loop is not over range(), the engine
+# prints diagnostics for both
+UNSUPPORTED = '''
+def f(a: int, b: int):
+    c: int = a * b
+    for x in [1, 2]:
+        pass
+    if c > 3:
+        return 1
+'''
+
+
+def test_stdout_only_carries_records(tmp_path):
+    (tmp_path / 'unsupported.py').write_text(UNSUPPORTED)
+    main = os.path.join(TEST_CASES, os.pardir, 'src', 'main.py')
+
+    for jobs in ('1', '2'):
+        output = subprocess.run([sys.executable, main, '--batch',
+                                 str(tmp_path), '--jobs', jobs],
+                                capture_output=True, text=True, check=True)
+        records = [json.loads(line) for line in output.stdout.splitlines()]
+        assert [record['function'] for record in records] == ['f']
+        assert 'DEBUG' in output.stderr
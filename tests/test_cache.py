@@ -0,0 +1,57 @@
+import ast
+
+from cache import AnalysisCache, MemoryCache
+from symbex import analyze_function
+
+
+SOURCE = '''
+def f(x: int):
+    if x > 1:
+        if x < 0:
+            return x
+    return 0
+'''
+
+# the same function with a comment line added inside it
+SHIFTED = '''
+def f(x: int):
+    if x > 1:
+        # x is positive here
+        if x < 0:
+            return x
+    return 0
+'''
+
+
+def get_body(source: str, blank_lines: int = 0) -> ast.FunctionDef:
+    return ast.parse('\n' * blank_lines + source).body[0]
+
+
+def test_moved_function_hits(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    body = get_body(SOURCE)
+    cache.put(body, analyze_function(body))
+
+    moved = get_body(SOURCE, blank_lines=5)
+    result = cache.get(moved)
+    assert result is not None
+    assert [err.lineno for err in result.errors] == [9]
+
+
+def test_relocated_lines_miss(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    body = get_body(SOURCE)
+    cache.put(body, analyze_function(body))
+
+    shifted = get_body(SHIFTED)
+    assert cache.key(shifted) != cache.key(body)
+    assert cache.get(shifted) is None
+
+
+def test_memory_cache_relocated_lines_miss():
+    cache = MemoryCache()
+    body = get_body(SOURCE)
+    cache.put(body, analyze_function(body))
+
+    assert cache.get(get_body(SOURCE, blank_lines=5)) is not None
+    assert cache.get(get_body(SHIFTED)) is None
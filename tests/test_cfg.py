@@ -0,0 +1,29 @@
+import ast
+import gc
+
+from cfg import CFGCache
+
+
+SOURCE = '''
+def f(x: int):
+    while x < 3:
+        x = x + 1
+    return x
+'''
+
+
+def test_cache_is_per_node_and_loop_mode():
+    cache = CFGCache()
+    body = ast.parse(SOURCE).body[0]
+
+    assert cache.get(body) is cache.get(body)
+    assert cache.get(body, True) is not cache.get(body)
+    assert cache.get(ast.parse(SOURCE).body[0]) is not cache.get(body)
+
+
+def test_entries_go_with_the_tree():
+    cache = CFGCache()
+    cache.get(ast.parse(SOURCE).body[0])
+    gc.collect()
+
+    assert len(cache.entries) == 0
@@ -0,0 +1,16 @@
+import pytest
+
+import FlaskApp
+
+
+@pytest.fixture
+def client():
+    return FlaskApp.app.test_client()
+
+
+@pytest.mark.parametrize('query', ['/run', '/run?stream=ndjson'])
+def test_syntax_error_is_a_bad_request(client, query):
+    response = client.post(query, data=b'def f(:\n')
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
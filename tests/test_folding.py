@@ -0,0 +1,33 @@
+import ast
+import os
+
+import pytest
+import z3
+
+import z3tools
+from conftest import TEST_CASES
+from symbex import analyze_function
+
+
+@pytest.mark.parametrize('left', range(-9, 10))
+@pytest.mark.parametrize('right', [-3, -2, -1, 1, 2, 3])
+def test_division_folds_like_z3(left, right):
+    div = z3.simplify(z3.IntVal(left) / z3.IntVal(right)).as_long()
+    mod = z3.simplify(z3.IntVal(left) % z3.IntVal(right)).as_long()
+
+    assert z3tools.fold('Div', left, right) == div
+    assert z3tools.fold('Mod', left, right) == mod
+
+
+def test_division_by_zero_is_not_folded():
+    assert z3tools.fold('Div', 7, 0) is None
+    assert z3tools.fold('Mod', 7, 0) is None
+
+
+def test_folded_branches_agree_with_the_solver():
+    with open(os.path.join(TEST_CASES, 'testdiv.py')) as source:
+        functions = ast.parse(source.read()).body
+
+    for body in functions:
+        result = analyze_function(body)
+        assert result.errors == []
@@ -0,0 +1,87 @@
+import ast
+
+from symbex import analyze_function
+
+
+def get_body(source: str) -> ast.FunctionDef:
+    return ast.parse(source).body[0]
+
+
+INT_ACCUMULATOR = '''
+def f(n: int):
+    acc: int = 0
+    for i in range(n):
+        acc += 3
+    if acc == 6:
+        return 1
+    return 0
+'''
+
+STR_ACCUMULATOR = '''
+def f(n: int, s: str):
+    t: str = "a"
+    for i in range(n):
+        t += s
+    return 0
+'''
+
+STR_CONSTANT = '''
+def f(n: int):
+    t: str = "a"
+    for i in range(n):
+        t += "b"
+    return 0
+'''
+
+CALL_INCREMENT = '''
+def f(n: int, s: str):
+    acc: int = 0
+    for i in range(n):
+        acc += len(s)
+    if n == 2:
+        return 1
+    return 0
+'''
+
+
+def test_int_accumulator_is_summarized():
+    result = analyze_function(get_body(INT_ACCUMULATOR))
+
+    assert result.stats['summarized'] == 1
+    assert ['n = 2'] in result.tests
+
+
+def test_str_accumulator_is_unrolled():
+    for source in (STR_ACCUMULATOR, STR_CONSTANT):
+        result = analyze_function(get_body(source))
+
+        assert result.stats['summarized'] == 0
+        assert result.errors == []
+
+
+def test_unsupported_increment_is_unrolled():
+    result = analyze_function(get_body(CALL_INCREMENT))
+
+    assert result.stats['summarized'] == 0
+    assert result.errors == []
+    assert ['n = 2', 's = None'] in result.tests
+
+
+PAST_THE_BOUND = '''
+def f(a: int):
+    x: int = 0
+    for i in range(10):
+        if a > i:
+            x = x + 1
+    if a == 50:
+        return 1
+    return 0
+'''
+
+
+def test_code_after_a_loop_cut_at_the_bound_is_explored():
+    for options in ({}, {'unroll': 4}):
+        result = analyze_function(get_body(PAST_THE_BOUND), options)
+
+        assert len(result.bounded) == 1
+        assert ['a = 50'] in result.tests
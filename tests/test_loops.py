@@ -0,0 +1,76 @@
+import ast
+
+from symbex import analyze_function
+
+
+def get_body(source: str) -> ast.FunctionDef:
+    return ast.parse(source).body[0]
+
+
+# line 5 is reached once the loop has run three times
+AFTER_LOOP = '''
+def f(b: int):
+    i: int = b - b
+    while i < 3:
+        i = i + 1
+    if b == 5:
+        return 1
+    return 0
+'''
+
+COUNTED = '''
+def f(n: int):
+    x: int = 0
+    for i in range(n):
+        if i == 2:
+            x = x + 10
+    return x
+'''
+
+DEAD = '''
+def f(n: int):
+    i: int = 0
+    while i < n:
+        i = i + 1
+    if n < 0:
+        if n > 0:
+            return 1
+    return 0
+'''
+
+
+def test_infeasible_loop_exits_are_pruned():
+    result = analyze_function(get_body(AFTER_LOOP), {'unroll': 5})
+
+    assert result.errors == []
+    assert ['b = 5'] in result.tests
+
+
+def test_early_iterations_do_not_make_a_branch_dead():
+    result = analyze_function(get_body(COUNTED))
+
+    assert result.errors == []
+
+
+def test_dead_branch_is_reported_once():
+    result = analyze_function(get_body(DEAD), {'unroll': 3})
+
+    assert [err.lineno for err in result.errors] == [7]
+
+
+PAST_THE_BOUND = '''
+def f(a: int):
+    i: int = 0
+    while i < 10:
+        i = i + 1
+    if a == 50:
+        return 1
+    return 0
+'''
+
+
+def test_paths_leave_the_loop_at_the_bound():
+    result = analyze_function(get_body(PAST_THE_BOUND), {'unroll': 4})
+
+    assert len(result.bounded) == 1
+    assert ['a = 50'] in result.tests
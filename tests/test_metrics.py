@@ -0,0 +1,49 @@
+import ast
+import os
+
+from conftest import TEST_CASES
+from metrics import Registry
+from symbex import analyze_function
+
+
+def get_functions(name: str) -> list:
+    with open(os.path.join(TEST_CASES, name)) as source:
+        return ast.parse(source.read()).body
+
+
+def test_cached_queries_are_not_z3_checks():
+    results = [analyze_function(body) for body in get_functions('testints.py')]
+
+    for result in results:
+        stats = result.stats
+        lines = result.metrics.lines.values()
+        assert stats['solver_calls'] == sum(l['solver_calls'] for l in lines)
+        assert stats['z3_checks'] == sum(l['z3_checks'] for l in lines)
+        assert stats['cached_queries'] == sum(l['cached_queries']
+                                              for l in lines)
+        # every query either reached Z3 or was answered without it
+        assert stats['solver_calls'] - stats['cached_queries'] \
+            <= stats['z3_checks']
+
+    assert any(result.stats['cached_queries'] for result in results)
+
+
+def test_prometheus_exports_both_counts():
+    registry = Registry()
+    for body in get_functions('testints.py'):
+        registry.observe('testints', analyze_function(body))
+
+    exposition = registry.prometheus()
+    assert '# TYPE symbex_z3_checks_total counter' in exposition
+    assert '# TYPE symbex_cached_queries_total counter' in exposition
+
+
+def test_series_stay_bounded_across_modules():
+    result = analyze_function(get_functions('testints.py')[0])
+    registry = Registry(max_series=3)
+    for i in range(10):
+        registry.observe(f"module{i}", result)
+
+    assert len(registry.series) <= 3
+    assert registry.series[('_other', '_other')]['functions'] == 8
+    assert registry.prometheus().count('symbex_functions_total{') <= 3